@@ -0,0 +1,807 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks locales de convocatorias_cientificas1.
+
+Uso:
+    python benchmarks.py arranque [--repeticiones 15]
+    python benchmarks.py correo [--mensajes 2000] [--workers 4] [--adjunto-kb 0]
+                                [--por-sobre 100] [--max-rcpt 0] [--fallos 0.2]
+    python benchmarks.py padron [--filas 1000,10000,100000]
+    python benchmarks.py busqueda [--repeticiones 5] [--latencia 0.02]
+    python benchmarks.py todo [--json resultados.json]
+
+``arranque`` mide, en intérpretes nuevos, cuánto cuesta importar la app
+sobre un Streamlit ya cargado (lo que paga cada worker en frío) frente a
+importar de forma anticipada las dependencias pesadas, como hacía el
+módulo antes de diferirlas.
+
+El resto corre sin red ni credenciales reales: levanta un sumidero SMTP con
+STARTTLS (certificado propio de 127.0.0.1), un servidor SFTP de paramiko
+sobre un directorio temporal y un servidor HTTP con páginas de listado
+guardadas en ``fixtures/listados`` (comprueba títulos, ids y plazos
+extraídos contra ``esperado.json``), y usa la app en modo headless (sin Streamlit). Reporta
+mensajes/segundo, tiempos de carga, memoria pico (tracemalloc, en una
+pasada aparte) y p50/p99 por etapa. ``correo`` incluye además el modo CCO
+y una campaña con un corte parcial del relay (451 en ``--fallos`` de los
+RCPT y algunos buzones inexistentes) con y sin reintentos.
+"""
+import argparse
+import datetime
+import hashlib
+import ipaddress
+import json
+import math
+import os
+import random
+import socket
+import socketserver
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+RAIZ = Path(__file__).resolve().parent
+FIXTURES_LISTADOS = RAIZ / "fixtures" / "listados"
+MODULO_APP = 'convocatorias_cientificas1'
+DEPENDENCIAS_PESADAS = (
+    'pandas', 'numpy', 'pyarrow', 'requests', 'requests.adapters', 'urllib3.util.retry', 'bs4',
+    'paramiko', 'smtplib', 'ssl', 'email.mime.base', 'email.header', 'email.policy',
+    'email.encoders', 'email.quoprimime', 'email.utils',
+)
+
+PROGRAMA_ARRANQUE = '''
+import importlib, json, sys, time
+sys.path.insert(0, {raiz!r})
+t0 = time.perf_counter()
+import streamlit
+t1 = time.perf_counter()
+previas = set(sys.modules)
+for nombre in {modulos!r}:
+    importlib.import_module(nombre)
+t2 = time.perf_counter()
+cargadas = [m for m in {pesadas!r} if m in sys.modules and m not in previas]
+print(json.dumps({{"streamlit": t1 - t0, "modulos": t2 - t1, "cargadas": cargadas}}))
+'''
+
+
+# ==================== MEDICIÓN ====================
+def percentil(valores, q: float) -> float:
+    """Percentil ``q`` (0-100) por rango más cercano."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return float('nan')
+    return ordenados[max(0, math.ceil(q / 100 * len(ordenados)) - 1)]
+
+
+def resumen_latencias(segundos) -> dict:
+    """p50/p99/máximo en milisegundos."""
+    return {
+        'n': len(segundos),
+        'p50_ms': percentil(segundos, 50) * 1000,
+        'p99_ms': percentil(segundos, 99) * 1000,
+        'max_ms': max(segundos) * 1000 if segundos else float('nan'),
+    }
+
+
+def pico_memoria(funcion) -> int:
+    """Bytes pico asignados por Python durante ``funcion()`` (pasada aparte: tracemalloc la frena)."""
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def imprimir_etapas(etapas: dict):
+    print(f"  {'etapa':<40}{'n':>7}{'p50':>11}{'p99':>11}{'máx':>11}")
+    for nombre, r in etapas.items():
+        print(f"  {nombre:<40}{r['n']:>7}{r['p50_ms']:>9.2f}ms{r['p99_ms']:>9.2f}ms{r['max_ms']:>9.2f}ms")
+
+
+def cargar_app(directorio: Path, entorno: dict):
+    """Importa la app en modo headless con ``entorno`` como secretos y ``directorio`` como cwd."""
+    os.environ.update({clave: str(valor) for clave, valor in entorno.items()})
+    os.chdir(directorio)
+    sys.path.insert(0, str(RAIZ))
+    import convocatorias_cientificas1 as app
+    if not app.MODO_HEADLESS:
+        raise RuntimeError("la app debe importarse sin Streamlit para estos benchmarks")
+    return app
+
+
+def imprimir_metricas_app(instantanea: dict):
+    """Etapas, eventos y errores que registró la propia app durante los benchmarks."""
+    print("Métricas registradas por la app")
+    print(f"  {'etapa':<40}{'n':>7}{'p50':>11}{'p95':>11}{'p99':>11}")
+    for r in instantanea['etapas']:
+        print(f"  {r['etapa']:<40}{r['llamadas']:>7}{r['p50_ms']:>9.2f}ms{r['p95_ms']:>9.2f}ms{r['p99_ms']:>9.2f}ms")
+    print("  eventos: " + ", ".join(f"{e}={n}" for e, n in instantanea['eventos'].items()))
+    if instantanea['errores']:
+        print("  errores: " + ", ".join(f"{e['etapa']}/{e['tipo']}={e['cuenta']}" for e in instantanea['errores']))
+
+
+# ==================== SERVIDORES LOCALES ====================
+def certificado_local(directorio: Path) -> ssl.SSLContext:
+    """Contexto TLS de servidor con un certificado propio para 127.0.0.1.
+
+    El certificado se agrega como CA de confianza del proceso (SSL_CERT_FILE),
+    así el cliente de la app lo valida igual que a un relay real.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    clave = ec.generate_private_key(ec.SECP256R1())
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(nombre)
+        .issuer_name(nombre)
+        .public_key(clave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(ahora - datetime.timedelta(days=1))
+        .not_valid_after(ahora + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(
+            digital_signature=True, key_cert_sign=True, crl_sign=True, content_commitment=False,
+            key_encipherment=False, data_encipherment=False, key_agreement=False,
+            encipher_only=False, decipher_only=False), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(clave.public_key()), critical=False)
+        .sign(clave, hashes.SHA256())
+    )
+    ruta_cert = directorio / "sumidero.pem"
+    ruta_clave = directorio / "sumidero.key"
+    ruta_cert.write_bytes(certificado.public_bytes(serialization.Encoding.PEM))
+    ruta_clave.write_bytes(clave.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    os.environ['SSL_CERT_FILE'] = str(ruta_cert)
+
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    contexto.load_cert_chain(ruta_cert, ruta_clave)
+    return contexto
+
+
+class _ManejadorSMTP(socketserver.StreamRequestHandler):
+    """ESMTP mínimo: EHLO, STARTTLS, AUTH, MAIL/RCPT/DATA; descarta los mensajes."""
+
+    def _responder(self, *lineas: str):
+        self.wfile.write(b"".join(linea.encode('ascii') + b"\r\n" for linea in lineas))
+
+    def handle(self):
+        tls = False
+        destinatarios = 0
+        self._responder("220 127.0.0.1 sumidero ESMTP")
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            verbo = linea[:4].upper()
+            if verbo in (b'EHLO', b'HELO'):
+                extensiones = ["PIPELINING", "8BITMIME", "AUTH PLAIN"] + ([] if tls else ["STARTTLS"])
+                self._responder(*(f"250-{e}" for e in ["127.0.0.1"] + extensiones[:-1]), f"250 {extensiones[-1]}")
+            elif verbo == b'STAR':
+                self._responder("220 2.0.0 listo")
+                self.connection = self.server.tls.wrap_socket(self.connection, server_side=True)
+                self.rfile = self.connection.makefile('rb')
+                self.wfile = self.connection.makefile('wb', buffering=0)
+                tls = True
+            elif verbo == b'AUTH':
+                self._responder("235 2.7.0 ok")
+            elif verbo == b'MAIL':
+                destinatarios = 0
+                self._responder("250 2.1.0 ok")
+            elif verbo == b'RCPT':
+                if linea[8:].lstrip(b' <').startswith(b'rebota'):
+                    self._responder("550 5.1.1 buzon inexistente")
+                elif self.server.fallos and self.server.azar.random() < self.server.fallos:
+                    self._responder("451 4.3.0 relay saturado, intente mas tarde")
+                elif self.server.max_rcpt and destinatarios >= self.server.max_rcpt:
+                    self._responder("452 4.5.3 demasiados destinatarios")
+                else:
+                    destinatarios += 1
+                    self._responder("250 2.1.5 ok")
+            elif verbo == b'DATA':
+                self._responder("354 fin con <CRLF>.<CRLF>")
+                tamano = 0
+                lf_suelto = False
+                for renglon in self.rfile:
+                    if renglon == b".\r\n":
+                        break
+                    tamano += len(renglon)
+                    lf_suelto = lf_suelto or not renglon.endswith(b"\r\n")
+                if lf_suelto:
+                    # Como Postfix con smtpd_forbid_bare_newline
+                    self.server.lf_sueltos += 1
+                    self._responder("554 5.5.2 bare LF no permitido")
+                else:
+                    self.server.registrar(destinatarios, tamano)
+                    self._responder("250 2.0.0 en cola")
+            elif verbo == b'QUIT':
+                self._responder("221 2.0.0 bye")
+                return
+            else:
+                self._responder("250 2.0.0 ok")
+
+
+class SumideroSMTP(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, tls: ssl.SSLContext, max_rcpt: int = 0):
+        super().__init__(("127.0.0.1", 0), _ManejadorSMTP)
+        self.tls = tls
+        self.max_rcpt = max_rcpt
+        self.lf_sueltos = 0  # mensajes rechazados por llevar un LF sin CR
+        self.fallos = 0.0  # fracción de RCPT que reciben un 451 (corte parcial del relay)
+        self.azar = random.Random(0)
+        self.mensajes = self.destinatarios = self.bytes = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def puerto(self) -> int:
+        return self.server_address[1]
+
+    def registrar(self, destinatarios: int, tamano: int):
+        with self._lock:
+            self.mensajes += 1
+            self.destinatarios += destinatarios
+            self.bytes += tamano
+
+
+class ServidorSFTP:
+    """Servidor SFTP de sólo lectura (paramiko) con ``raiz`` como directorio '/'."""
+
+    def __init__(self, raiz: Path):
+        import paramiko
+
+        class Autorizacion(paramiko.ServerInterface):
+            def check_auth_password(self, usuario, password):
+                return paramiko.AUTH_SUCCESSFUL
+
+            def get_allowed_auths(self, usuario):
+                return "password"
+
+            def check_channel_request(self, tipo, canal):
+                return paramiko.OPEN_SUCCEEDED
+
+        class Manejador(paramiko.SFTPHandle):
+            def stat(self):
+                return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+        class Interfaz(paramiko.SFTPServerInterface):
+            def _ruta(self, ruta):
+                return os.path.join(raiz, ruta.lstrip('/'))
+
+            def stat(self, ruta):
+                try:
+                    return paramiko.SFTPAttributes.from_stat(os.stat(self._ruta(ruta)))
+                except OSError as e:
+                    return paramiko.SFTPServer.convert_errno(e.errno)
+
+            lstat = stat
+
+            def open(self, ruta, flags, atributos):
+                try:
+                    archivo = open(self._ruta(ruta), 'rb')
+                except OSError as e:
+                    return paramiko.SFTPServer.convert_errno(e.errno)
+                manejador = Manejador(flags)
+                manejador.readfile = archivo
+                manejador.filename = ruta
+                return manejador
+
+        self._llave = paramiko.ECDSAKey.generate()
+        self._socket = socket.socket()
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(16)
+        self.puerto = self._socket.getsockname()[1]
+
+        def aceptar():
+            while True:
+                conexion, _ = self._socket.accept()
+                transporte = paramiko.Transport(conexion)
+                transporte.add_server_key(self._llave)
+                transporte.set_subsystem_handler("sftp", paramiko.SFTPServer, Interfaz)
+                transporte.start_server(server=Autorizacion())
+
+        threading.Thread(target=aceptar, daemon=True).start()
+
+
+class ServidorListados(ThreadingHTTPServer):
+    """Sirve las páginas de listado guardadas en ``raiz`` con ETag (304 a las revalidaciones).
+
+    ``/secihti.mx/becas-nacionales/`` se resuelve a ``raiz/secihti.mx/becas-nacionales.html``;
+    las rutas sin página guardada responden 404, como un sitio caído.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, raiz: Path = FIXTURES_LISTADOS, latencia: float = 0.02):
+        self.raiz = raiz
+        self.latencia = latencia
+        self.respuestas = defaultdict(int)
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(servidor.latencia)
+                archivo = servidor.raiz / (self.path.split('?')[0].strip('/') + '.html')
+                if not archivo.is_file():
+                    servidor.respuestas[404] += 1
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                cuerpo = archivo.read_bytes()
+                etag = '"' + hashlib.sha1(cuerpo).hexdigest()[:16] + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    servidor.respuestas[304] += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                servidor.respuestas[200] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Manejador)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def puerto(self) -> int:
+        return self.server_address[1]
+
+    def reescribir(self, url: str) -> str:
+        partes = urlsplit(url)
+        return f"http://127.0.0.1:{self.puerto}/{partes.netloc}{partes.path}"
+
+
+def sembrar_padron(ruta: Path, filas: int, semilla: int = 7) -> int:
+    """CSV como el del servidor remoto; ~10% inactivos o con correo inválido."""
+    azar = random.Random(semilla)
+    especialidades = ["Cardiología", "Pediatría", "Física", "Química", "Biología molecular",
+                      "Energía", "Agropecuario", "Salud pública", "Neurociencias", "Docencia"]
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        f.write("Nombre Completo,Correo Electronico,Estado,Especialidad,Fecha\r\n")
+        for i in range(filas):
+            estado = "inactivo" if azar.random() < 0.05 else "activo"
+            correo = f"persona{i}@example.com" if azar.random() > 0.05 else f"persona{i}-sin-arroba"
+            f.write(f"Persona Número {i},{correo},{estado},\"{azar.choice(especialidades)}\",2025-01-{1 + i % 28:02d}\r\n")
+    return ruta.stat().st_size
+
+
+# ==================== BENCHMARKS ====================
+def _medir_arranque(modulos, repeticiones: int) -> dict:
+    programa = PROGRAMA_ARRANQUE.format(raiz=str(RAIZ), modulos=list(modulos), pesadas=list(DEPENDENCIAS_PESADAS))
+    muestras = []
+    with tempfile.TemporaryDirectory() as directorio:
+        for _ in range(repeticiones):
+            salida = subprocess.run(
+                [sys.executable, '-c', programa], cwd=directorio, check=True,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'},
+            )
+            muestras.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+    return {
+        'streamlit_ms': statistics.median(m['streamlit'] for m in muestras) * 1000,
+        'mediana_ms': statistics.median(m['modulos'] for m in muestras) * 1000,
+        'minimo_ms': min(m['modulos'] for m in muestras) * 1000,
+        'cargadas': muestras[-1]['cargadas'],
+    }
+
+
+def benchmark_arranque(repeticiones: int = 15) -> dict:
+    # Una pasada de calentamiento para que ambos casos partan con la caché de disco caliente
+    _medir_arranque([MODULO_APP] + list(DEPENDENCIAS_PESADAS), 1)
+    diferido = _medir_arranque([MODULO_APP], repeticiones)
+    anticipado = _medir_arranque(list(DEPENDENCIAS_PESADAS) + [MODULO_APP], repeticiones)
+
+    print(f"Arranque en frío ({repeticiones} intérpretes nuevos, Streamlit ya importado: "
+          f"{diferido['streamlit_ms']:.0f} ms)")
+    print(f"  {'caso':<34}{'mediana':>10}{'mínimo':>10}")
+    print(f"  {'app con importación diferida':<34}{diferido['mediana_ms']:>8.1f}ms{diferido['minimo_ms']:>8.1f}ms")
+    print(f"  {'app + dependencias anticipadas':<34}{anticipado['mediana_ms']:>8.1f}ms{anticipado['minimo_ms']:>8.1f}ms")
+    print(f"  ahorro: {anticipado['mediana_ms'] - diferido['mediana_ms']:.1f} ms por arranque")
+    print(f"  dependencias pesadas que la app carga además de Streamlit: {', '.join(diferido['cargadas']) or 'ninguna'}")
+    return {'diferido': diferido, 'anticipado': anticipado}
+
+
+def benchmark_correo(app, sumidero: SumideroSMTP, mensajes: int = 2000, workers: int = 4,
+                     adjunto_kb: int = 0, sesion_nueva: int = 200, por_sobre: int = 100) -> dict:
+    """Campaña completa por sesiones reutilizadas frente a ``enviar_correo`` con sesión nueva y al modo CCO."""
+    adjunto = os.urandom(adjunto_kb * 1024) if adjunto_kb else None
+    plantilla = app.PlantillaCorreo(
+        # Asunto predeterminado de la app: largo y con emoji, se pliega en varias líneas
+        app.asunto_convocatoria({'titulo': "Convocatoria de prueba para proyectos de investigación científica"}),
+        app.mensaje_resumen([], "2026-01-01") * 3,
+        adjunto_nombre="bases.pdf" if adjunto else None, adjunto_datos=adjunto
+    )
+    destinatarios = [{'nombre': f"Persona {i}", 'email': f"persona{i}@example.com"} for i in range(mensajes)]
+
+    render = []
+    for d in destinatarios[:min(mensajes, 1000)]:
+        inicio = time.perf_counter()
+        plantilla.renderizar(d['email'], d['nombre'])
+        render.append(time.perf_counter() - inicio)
+
+    envio = []
+
+    def enviar_uno(destinatario, sesion):
+        inicio = time.perf_counter()
+        ok = plantilla.enviar(sesion, destinatario['email'], destinatario['nombre'])
+        envio.append(time.perf_counter() - inicio)
+        return ok
+
+    recibidos = sumidero.mensajes
+    inicio = time.perf_counter()
+    exitosos = app.despachar_correos(destinatarios, enviar_uno, workers=workers, tasa=0)
+    duracion = time.perf_counter() - inicio
+    recibidos = sumidero.mensajes - recibidos
+
+    individuales = []
+    for d in destinatarios[:sesion_nueva]:
+        inicio = time.perf_counter()
+        app.enviar_correo(d['email'], "Convocatoria de prueba", "Cuerpo de prueba", adjunto=None)
+        individuales.append(time.perf_counter() - inicio)
+
+    sobres = app.repartir_en_sobres([d['email'] for d in destinatarios], por_sobre)
+    envio_sobre = []
+
+    def enviar_sobre(lote, sesion):
+        inicio = time.perf_counter()
+        resultados = plantilla.enviar_lote(sesion, lote)
+        envio_sobre.append(time.perf_counter() - inicio)
+        return resultados
+
+    transacciones_cco, entregas_cco = sumidero.mensajes, sumidero.destinatarios
+    inicio = time.perf_counter()
+    aceptados_cco = app.despachar_correos(sobres, enviar_sobre, workers=workers, tasa=0)
+    duracion_cco = time.perf_counter() - inicio
+    transacciones_cco = sumidero.mensajes - transacciones_cco
+    entregas_cco = sumidero.destinatarios - entregas_cco
+
+    etapas = {
+        'renderizar plantilla': resumen_latencias(render),
+        f'envío en sesión reutilizada ({workers} hilos)': resumen_latencias(envio),
+        'enviar_correo con sesión nueva': resumen_latencias(individuales),
+        f'sobre CCO de hasta {por_sobre} ({workers} hilos)': resumen_latencias(envio_sobre),
+    }
+    pico = pico_memoria(lambda: app.despachar_correos(destinatarios, enviar_uno, workers=workers, tasa=0))
+    resultado = {
+        'mensajes': mensajes,
+        'exitosos': exitosos,
+        'recibidos_sumidero': recibidos,
+        'mensajes_por_segundo': exitosos / duracion,
+        'mensajes_por_segundo_sesion_nueva': len(individuales) / sum(individuales) if individuales else float('nan'),
+        'pico_memoria_mb': pico / 2**20,
+        'cco': {
+            'por_sobre': por_sobre,
+            'aceptados': aceptados_cco,
+            'entregas_sumidero': entregas_cco,
+            'transacciones_data': transacciones_cco,
+            'destinatarios_por_segundo': aceptados_cco / duracion_cco,
+        },
+        'etapas': etapas,
+    }
+    print(f"Correo: {mensajes} mensajes a un sumidero SMTP local con STARTTLS"
+          f"{f', adjunto de {adjunto_kb} KB' if adjunto_kb else ''}")
+    print(f"  {exitosos} exitosos ({recibidos} recibidos) en {duracion:.2f} s: "
+          f"{resultado['mensajes_por_segundo']:.0f} mensajes/s; con sesión nueva por correo: "
+          f"{resultado['mensajes_por_segundo_sesion_nueva']:.0f} mensajes/s")
+    print(f"  modo CCO ({por_sobre} por sobre{f', el sumidero acepta {sumidero.max_rcpt}' if sumidero.max_rcpt else ''}): "
+          f"{aceptados_cco} destinatarios ({entregas_cco} en el sumidero) en {transacciones_cco} transacciones DATA, "
+          f"{resultado['cco']['destinatarios_por_segundo']:.0f} destinatarios/s")
+    print(f"  memoria pico de la campaña: {resultado['pico_memoria_mb']:.1f} MB")
+    imprimir_etapas(etapas)
+    assert not sumidero.lf_sueltos, f"{sumidero.lf_sueltos} mensajes con LF sin CR"
+    return resultado
+
+
+def cpu_en_espera_de_reintentos(app, espera: float = 1.0) -> float:
+    """CPU que gasta ``despachar_correos`` mientras todo lo pendiente espera un reintento.
+
+    El primer intento de cada destinatario falla con 451 y el segundo se
+    reprograma a ``espera`` segundos: en ese lapso no hay envíos en curso
+    y el hilo que despacha debería estar dormido.
+    """
+    intentos = Counter()
+
+    def enviar_uno(destinatario, sesion):
+        intentos[destinatario] += 1
+        return True if intentos[destinatario] > 1 else app.Fallo(451, "4.3.0 pruebe luego", permanente=False)
+
+    politica = app.PoliticaReintentos(intentos=2, base=2 * espera, tope=2 * espera)
+    cpu = time.thread_time()
+    exitosos = app.despachar_correos(list(range(4)), enviar_uno, workers=2, tasa=0, reintentos=politica)
+    cpu = time.thread_time() - cpu
+    assert exitosos == 4, exitosos
+    return cpu
+
+
+def benchmark_reintentos(app, sumidero: SumideroSMTP, mensajes: int = 2000, workers: int = 4,
+                         fallos: float = 0.2, rebotan: int = 20) -> dict:
+    """Campaña durante un corte parcial del relay: 451 en una fracción de los RCPT y buzones inexistentes."""
+    plantilla = app.PlantillaCorreo("Convocatoria de prueba", "Cuerpo de prueba")
+    destinatarios = [{'nombre': f"Persona {i}", 'email': f"{'rebota' if i < rebotan else 'persona'}{i}@example.com"}
+                     for i in range(mensajes)]
+    # Esperas cortas para que el benchmark termine pronto; la forma de la curva es la misma
+    politica = app.PoliticaReintentos(intentos=8, base=0.05, tope=1.0)
+    intentos = []
+    definitivos = Counter()
+
+    def enviar_uno(destinatario, sesion):
+        inicio = time.perf_counter()
+        resultado = plantilla.enviar(sesion, destinatario['email'], destinatario['nombre'])
+        intentos.append(time.perf_counter() - inicio)
+        return resultado
+
+    def al_avanzar(hechos, total, destinatario, resultado):
+        if resultado:
+            definitivos['entregado'] += 1
+        elif resultado.del_buzon:
+            definitivos['rebote'] += 1
+        else:
+            definitivos['transitorio' if not resultado.permanente else 'permanente'] += 1
+
+    sumidero.fallos = fallos
+    try:
+        inicio = time.perf_counter()
+        sin_reintentos = app.despachar_correos(destinatarios, enviar_uno, workers=workers, tasa=0)
+        duracion_sin = time.perf_counter() - inicio
+        intentos.clear()
+        inicio = time.perf_counter()
+        exitosos = app.despachar_correos(destinatarios, enviar_uno, workers=workers, tasa=0,
+                                         al_avanzar=al_avanzar, reintentos=politica)
+        duracion = time.perf_counter() - inicio
+    finally:
+        sumidero.fallos = 0.0
+
+    resultado = {
+        'mensajes': mensajes,
+        'fraccion_fallos': fallos,
+        'exitosos_sin_reintentos': sin_reintentos,
+        'exitosos': exitosos,
+        'intentos': len(intentos),
+        'definitivos': dict(definitivos),
+        'mensajes_por_segundo_sin_reintentos': sin_reintentos / duracion_sin,
+        'mensajes_por_segundo': exitosos / duracion,
+        'etapas': {'intento de envío': resumen_latencias(intentos)},
+    }
+    print(f"Reintentos: {mensajes} destinatarios ({rebotan} buzones inexistentes), "
+          f"{fallos:.0%} de los RCPT con 451")
+    print(f"  sin reintentos: {sin_reintentos} entregados en {duracion_sin:.2f} s "
+          f"({resultado['mensajes_por_segundo_sin_reintentos']:.0f}/s)")
+    print(f"  con reintentos: {exitosos} entregados en {duracion:.2f} s ({resultado['mensajes_por_segundo']:.0f}/s), "
+          f"{len(intentos)} intentos; definitivos {dict(definitivos)}")
+    imprimir_etapas(resultado['etapas'])
+
+    cpu = cpu_en_espera_de_reintentos(app)
+    resultado['cpu_en_espera_s'] = cpu
+    print(f"  CPU del despacho mientras todos esperan reintento (~1 s): {cpu * 1000:.1f} ms")
+    # Un despacho que no duerme consume el segundo completo
+    assert cpu < 0.1, f"despachar_correos no duerme mientras espera reintentos ({cpu:.2f} s de CPU)"
+    return resultado
+
+
+def benchmark_padron(app, raiz_sftp: Path, filas=(1000, 10000, 100000), repeticiones: int = 5) -> dict:
+    """Carga del padrón por SFTP (fría, forzada y desde caché) y parseo local."""
+    resultados = {}
+    print("Padrón de interesados vía SFTP local")
+    for n in filas:
+        nombre = f"padron_{n}.csv"
+        tamano = sembrar_padron(raiz_sftp / nombre, n)
+        app.CONFIG.REMOTE_FILE = nombre
+        limite = app.CONFIG.MAX_FILE_SIZE_MB * 1024 * 1024
+
+        def parsear():
+            with open(raiz_sftp / nombre, 'rb') as f:
+                return app.construir_padron(app.iterar_interesados(app.decodificar_lineas(app.leer_fragmentos(f, limite))))
+
+        inicio = time.perf_counter()
+        activos = app.obtener_interesados_activos(forzar=True)
+        primera = time.perf_counter() - inicio
+
+        forzadas, cache, locales = [], [], []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            app.obtener_interesados_activos(forzar=True)
+            forzadas.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            app.obtener_interesados_activos()
+            cache.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            parsear()
+            locales.append(time.perf_counter() - inicio)
+
+        pico = pico_memoria(lambda: app.obtener_interesados_activos(forzar=True))
+
+        # Índice de la búsqueda por texto: cada consulta es la primera de su término (en frío)
+        columnas = (activos['nombre'], activos['email'], activos['especialidad'])
+        inicio = time.perf_counter()
+        indice = app.IndiceInteresados(zip(*columnas))
+        construccion = time.perf_counter() - inicio
+        consultas = ['p', 'per', 'ex', 'card', 'numero 12', 'persona123', 'salud publica']
+        frias = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            indice.buscar(consulta)
+            frias.append(time.perf_counter() - inicio)
+        pico_indice = pico_memoria(lambda: app.IndiceInteresados(zip(*columnas)))
+
+        etapas = {
+            'descarga + parseo (forzada)': resumen_latencias(forzadas),
+            'revalidación por stat (caché)': resumen_latencias(cache),
+            'parseo local': resumen_latencias(locales),
+            'índice: consulta en frío': resumen_latencias(frias),
+        }
+        resultados[n] = {
+            'bytes': tamano,
+            'activos': len(activos),
+            'memoria_padron_mb': activos.memory_usage(deep=True).sum() / 2**20,
+            'primera_carga_ms': primera * 1000,
+            'filas_por_segundo': n / statistics.median(forzadas),
+            'pico_memoria_mb': pico / 2**20,
+            'indice_construccion_ms': construccion * 1000,
+            'indice_pico_memoria_mb': pico_indice / 2**20,
+            'etapas': etapas,
+        }
+        print(f" {n} filas ({tamano / 2**20:.1f} MB, {len(activos)} activos): primera carga "
+              f"{primera * 1000:.0f} ms, {resultados[n]['filas_por_segundo']:.0f} filas/s, "
+              f"memoria pico {resultados[n]['pico_memoria_mb']:.1f} MB, padrón retenido "
+              f"{resultados[n]['memoria_padron_mb']:.1f} MB; índice en {construccion * 1000:.0f} ms, "
+              f"pico {resultados[n]['indice_pico_memoria_mb']:.1f} MB")
+        imprimir_etapas(etapas)
+        # La búsqueda corre en cada tecla: ninguna consulta en frío debería pasar de 1 ms
+        assert statistics.median(frias) < 0.001, f"consultas al índice lentas ({max(frias) * 1000:.1f} ms)"
+    return resultados
+
+
+def comprobar_listados(encontradas: list, esperado: dict, fijas: set):
+    """Lo extraído de cada página guardada debe coincidir con ``esperado.json``."""
+    for pagina, filas in esperado.items():
+        obtenidas = [{clave: c[clave] for clave in ('id', 'titulo', 'enlace', 'plazo')}
+                     for c in encontradas if c['id'].startswith(pagina + '-')]
+        assert obtenidas == filas, f"{pagina}: se extrajo {obtenidas}, se esperaba {filas}"
+    # Las páginas sin copia guardada responden 404 y conservan su entrada fija
+    ids = {c['id'] for c in encontradas}
+    faltantes = sorted(fijas - ids)
+    assert not faltantes, f"entradas fijas perdidas: {faltantes}"
+
+
+def benchmark_busqueda(app, repeticiones: int = 5, latencia: float = 0.02) -> dict:
+    """``buscar_todas`` contra listados guardados: primera pasada (200) y revalidaciones (304)."""
+    servidor = ServidorListados(latencia=latencia)
+    esperado = json.loads((FIXTURES_LISTADOS / "esperado.json").read_text(encoding='utf-8'))
+    fijas = {c['id'] for c in app.BuscadorConvocatoriasNacionales(scraping=False).buscar_todas()} - set(esperado)
+    motor = app.MotorScraping(cache=app.CacheHTTP(Path("data") / "http_cache_benchmark"))
+    tiempos = defaultdict(list)
+
+    class BuscadorCronometrado(app.BuscadorConvocatoriasNacionales):
+        def fuentes(self):
+            def cronometrar(nombre, fuente):
+                def envoltura():
+                    inicio = time.perf_counter()
+                    try:
+                        return fuente()
+                    finally:
+                        tiempos[nombre].append(time.perf_counter() - inicio)
+                return envoltura
+            return [(nombre, cronometrar(nombre, fuente)) for nombre, fuente in super().fuentes()]
+
+    buscador = BuscadorCronometrado(motor=motor, reescribir_url=servidor.reescribir)
+    totales = []
+    encontradas = 0
+    for _ in range(repeticiones + 1):
+        inicio = time.perf_counter()
+        convocatorias = buscador.buscar_todas()
+        totales.append(time.perf_counter() - inicio)
+        comprobar_listados(convocatorias, esperado, fijas)
+        encontradas = len(convocatorias)
+    etapas = {'buscar_todas (primera, 200)': resumen_latencias(totales[:1]),
+              'buscar_todas (revalidación, 304)': resumen_latencias(totales[1:])}
+    etapas.update({f'fuente {nombre}': resumen_latencias(t) for nombre, t in tiempos.items()})
+    pico = pico_memoria(buscador.buscar_todas)
+    resultado = {
+        'convocatorias': encontradas,
+        'respuestas_http': dict(servidor.respuestas),
+        'pico_memoria_mb': pico / 2**20,
+        'etapas': etapas,
+    }
+    print(f"Búsqueda: {encontradas} convocatorias, {repeticiones + 1} pasadas, latencia HTTP simulada "
+          f"{latencia * 1000:.0f} ms, respuestas {dict(servidor.respuestas)}, memoria pico "
+          f"{resultado['pico_memoria_mb']:.1f} MB")
+    imprimir_etapas(etapas)
+    servidor.shutdown()
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', type=Path, metavar='ARCHIVO', help='guarda los resultados para compararlos')
+    subcomandos = parser.add_subparsers(dest='benchmark', required=True)
+    arranque = subcomandos.add_parser('arranque', help='tiempo de importación en frío')
+    arranque.add_argument('--repeticiones', type=int, default=15)
+    correo = subcomandos.add_parser('correo', help='throughput SMTP contra un sumidero local')
+    padron = subcomandos.add_parser('padron', help='carga del padrón por SFTP local')
+    busqueda = subcomandos.add_parser('busqueda', help='buscar_todas contra listados locales')
+    todo = subcomandos.add_parser('todo', help='correo, padrón y búsqueda')
+    for sub in (correo, todo):
+        sub.add_argument('--mensajes', type=int, default=2000)
+        sub.add_argument('--workers', type=int, default=4)
+        sub.add_argument('--adjunto-kb', type=int, default=0)
+        sub.add_argument('--sesion-nueva', type=int, default=200, help='envíos con enviar_correo sin sesión compartida')
+        sub.add_argument('--por-sobre', type=int, default=100, help='destinatarios por sobre en modo CCO')
+        sub.add_argument('--max-rcpt', type=int, default=0, help='RCPT por transacción que acepta el sumidero (452 al exceder)')
+        sub.add_argument('--fallos', type=float, default=0.2, help='fracción de RCPT con 451 en la prueba de reintentos')
+    for sub in (padron, todo):
+        sub.add_argument('--filas', default='1000,10000,100000', help='tamaños del padrón, separados por coma')
+    for sub in (padron, busqueda, todo):
+        sub.add_argument('--repeticiones', type=int, default=5)
+    for sub in (busqueda, todo):
+        sub.add_argument('--latencia', type=float, default=0.02, help='segundos por respuesta HTTP')
+    args = parser.parse_args(argv)
+    if args.json:
+        args.json = args.json.resolve()
+
+    resultados = {}
+    if args.benchmark == 'arranque':
+        resultados['arranque'] = benchmark_arranque(args.repeticiones)
+    else:
+        with tempfile.TemporaryDirectory() as directorio:
+            directorio = Path(directorio)
+            raiz_sftp = directorio / "sftp"
+            raiz_sftp.mkdir()
+            sumidero = SumideroSMTP(certificado_local(directorio), getattr(args, 'max_rcpt', 0))
+            servidor_sftp = ServidorSFTP(raiz_sftp)
+            app = cargar_app(directorio, {
+                'SMTP_SERVER': "127.0.0.1", 'SMTP_PORT': sumidero.puerto,
+                'EMAIL_USER': "benchmark@example.com", 'EMAIL_PASSWORD': "x",
+                'NOTIFICATION_EMAIL': "benchmark@example.com",
+                'REMOTE_HOST': "127.0.0.1", 'REMOTE_PORT': servidor_sftp.puerto,
+                'REMOTE_USER': "benchmark", 'REMOTE_PASSWORD': "x",
+                'REMOTE_DIR': "/", 'REMOTE_FILE': "padron.csv",
+            })
+            if args.benchmark in ('correo', 'todo'):
+                resultados['correo'] = benchmark_correo(
+                    app, sumidero, args.mensajes, args.workers, args.adjunto_kb, args.sesion_nueva, args.por_sobre
+                )
+                resultados['reintentos'] = benchmark_reintentos(app, sumidero, args.mensajes, args.workers, args.fallos)
+            if args.benchmark in ('padron', 'todo'):
+                filas = [int(n) for n in args.filas.split(',') if n.strip()]
+                resultados['padron'] = benchmark_padron(app, raiz_sftp, filas, args.repeticiones)
+            if args.benchmark in ('busqueda', 'todo'):
+                resultados['busqueda'] = benchmark_busqueda(app, args.repeticiones, args.latencia)
+            resultados['metricas_app'] = app.METRICAS.instantanea()
+            imprimir_metricas_app(resultados['metricas_app'])
+            os.chdir(RAIZ)
+
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
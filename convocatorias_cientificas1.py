@@ -1,55 +1,380 @@
 # -*- coding: utf-8 -*-
-import streamlit as st
-import requests
-import pandas as pd
+from __future__ import annotations
+
 import time
+import atexit
+import contextlib
 from datetime import datetime
 import json
+import sqlite3
 import csv
+import codecs
 import os
 from pathlib import Path
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Optional
 import sys
-import paramiko
+import threading
+import importlib
+import inspect
+import functools
+import itertools
+import logging
+import argparse
+import tomllib  # Python >= 3.11 (ver requirements.txt)
 from io import StringIO
-import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from email.utils import formatdate
 import re
+import bisect
+import math
+import unicodedata
+import socket
+import uuid
+import weakref
+import hashlib
+import array
+import heapq
+import random
+from urllib.parse import urljoin
+
+
+class ModuloDiferido:
+    """Módulo que se importa la primera vez que se usa uno de sus atributos.
+
+    Streamlit, pandas, numpy, requests, bs4, paramiko y la pila SMTP/MIME
+    suman más de un segundo de importación; con esto sólo los paga el camino que los necesita
+    (las recargas del script los encuentran ya en ``sys.modules``).
+    ``submodulos`` se importan junto con el paquete para poder usarlos como
+    atributos (``requests.adapters``, ``email.mime.base``...).
+    """
+
+    def __init__(self, nombre: str, *submodulos: str):
+        self._nombre = nombre
+        self._submodulos = submodulos
+        self._modulo = None
+
+    def __getattr__(self, atributo):
+        modulo = self._modulo
+        if modulo is None:
+            modulo = importlib.import_module(self._nombre)
+            for submodulo in self._submodulos:
+                importlib.import_module(submodulo)
+            self._modulo = modulo
+        return getattr(modulo, atributo)
+
+    def __repr__(self):
+        estado = 'cargado' if self._modulo is not None else 'diferido'
+        return f"<ModuloDiferido {self._nombre} ({estado})>"
+
 
-# ==================== CONFIGURACIÓN DE LA PÁGINA ====================
-st.set_page_config(
-    page_title="Buscador de Convocatorias Nacionales",
-    page_icon="🇲🇽",
-    layout="wide",
-    initial_sidebar_state="expanded"
+# Fuera de ``streamlit run`` (p. ej. ``python -m convocatorias_cientificas1 run``)
+# la app corre sin interfaz y nunca importa Streamlit
+MODO_HEADLESS = 'streamlit' not in sys.modules
+
+st = ModuloDiferido('streamlit')
+pd = ModuloDiferido('pandas')
+np = ModuloDiferido('numpy')
+pa = ModuloDiferido('pyarrow', 'pyarrow.compute')
+requests = ModuloDiferido('requests', 'requests.adapters')
+urllib3 = ModuloDiferido('urllib3', 'urllib3.util.retry')
+bs4 = ModuloDiferido('bs4')
+paramiko = ModuloDiferido('paramiko')
+smtplib = ModuloDiferido('smtplib')
+ssl = ModuloDiferido('ssl')
+email = ModuloDiferido(
+    'email', 'email.mime.base', 'email.header', 'email.policy',
+    'email.encoders', 'email.quoprimime', 'email.utils'
 )
 
+# ==================== MODO DE EJECUCIÓN ====================
+registro = logging.getLogger("convocatorias")
+
+
+def avisar(mensaje: str, nivel: str = 'error'):
+    """Muestra ``mensaje`` en la página (``st.error``/``st.warning``) o, sin interfaz, lo registra."""
+    if MODO_HEADLESS:
+        registro.log(logging.ERROR if nivel == 'error' else logging.WARNING, mensaje)
+    else:
+        getattr(st, nivel)(mensaje)
+
+
+def recurso_compartido(max_entries: Optional[int] = None):
+    """``st.cache_resource`` en la app; sin interfaz, una caché de proceso equivalente.
+
+    Como en Streamlit, los argumentos cuyo nombre empieza con ``_`` no forman
+    parte de la clave y cada recurso se crea una sola vez aunque lo pidan
+    varios hilos a la vez.
+    """
+    def decorar(funcion):
+        if not MODO_HEADLESS:
+            return st.cache_resource(show_spinner=False, max_entries=max_entries)(funcion)
+
+        firma = inspect.signature(funcion)
+        entradas = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            clave = tuple((n, v) for n, v in argumentos.arguments.items() if not n.startswith('_'))
+            with lock:
+                if clave in entradas:
+                    entradas.move_to_end(clave)
+                    return entradas[clave]
+                valor = entradas[clave] = funcion(*args, **kwargs)
+                if max_entries and len(entradas) > max_entries:
+                    entradas.popitem(last=False)
+                return valor
+
+        envoltura.clear = entradas.clear
+        return envoltura
+    return decorar
+
+
+def fragmento(run_every=None):
+    """``st.fragment`` en la app; sin interfaz deja la función como está."""
+    return (lambda funcion: funcion) if MODO_HEADLESS else st.fragment(run_every=run_every)
+
+# ==================== MÉTRICAS ====================
+class HistogramaLatencias:
+    """Latencias de una etapa: cubetas acumuladas (Prometheus) y una muestra reciente para percentiles."""
+
+    CUBETAS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, muestra: int = 2048):
+        self.cubetas = [0] * (len(self.CUBETAS) + 1)  # la última es +Inf
+        self.cuenta = 0
+        self.suma = 0.0
+        self.recientes = deque(maxlen=muestra)
+
+    def observar(self, segundos: float):
+        self.cubetas[bisect.bisect_left(self.CUBETAS, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+        self.recientes.append(segundos)
+
+    def percentiles(self, cuantiles=(50, 95, 99)) -> Dict[int, float]:
+        """Percentiles (rango más cercano) de las últimas observaciones."""
+        ordenados = sorted(self.recientes)
+        if not ordenados:
+            return {q: float('nan') for q in cuantiles}
+        return {q: ordenados[max(0, math.ceil(q / 100 * len(ordenados)) - 1)] for q in cuantiles}
+
+
+class Cronometro:
+    """Suma el tiempo de varios tramos de una misma etapa (p. ej. lecturas intercaladas con el parseo)."""
+
+    def __init__(self):
+        self.segundos = 0.0
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos += time.perf_counter() - self._inicio
+        return False
+
+
+class Metricas:
+    """Métricas del proceso: latencia por etapa, contadores de eventos y errores por tipo.
+
+    Una observación cuesta un lock y unas sumas, así que se puede medir el
+    camino caliente (cada correo, cada lectura). ``exportar`` escribe el
+    formato de texto de Prometheus, listo para el textfile collector.
+    """
+
+    PREFIJO = "convocatorias"
+
+    def __init__(self):
+        self.ruta: Optional[Path] = None  # lo fija ``exportar_metricas``
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+        self._latencias: Dict[str, HistogramaLatencias] = {}
+        self._eventos = Counter()
+        self._errores = Counter()
+        self._cambios = 0
+
+    def observar(self, etapa: str, segundos: float):
+        with self._lock:
+            histograma = self._latencias.get(etapa)
+            if histograma is None:
+                histograma = self._latencias[etapa] = HistogramaLatencias()
+            histograma.observar(segundos)
+            self._cambios += 1
+
+    def contar(self, evento: str, n: int = 1):
+        with self._lock:
+            self._eventos[evento] += n
+            self._cambios += 1
+
+    def error(self, etapa: str, error):
+        """Cuenta un error de ``etapa``; ``error`` es la excepción o el nombre del tipo."""
+        tipo = error if isinstance(error, str) else type(error).__name__
+        with self._lock:
+            self._errores[etapa, tipo] += 1
+            self._cambios += 1
+
+    @contextlib.contextmanager
+    def medir(self, etapa: str):
+        """Mide el bloque como una observación de ``etapa``; si lanza, cuenta el error y lo propaga."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(etapa, e)
+            raise
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def instantanea(self) -> Dict:
+        """Copia consistente para mostrar: etapas con p50/p95/p99, eventos y errores."""
+        with self._lock:
+            etapas = []
+            for etapa, histograma in sorted(self._latencias.items()):
+                p = histograma.percentiles()
+                etapas.append({
+                    'etapa': etapa,
+                    'llamadas': histograma.cuenta,
+                    'p50_ms': p[50] * 1000,
+                    'p95_ms': p[95] * 1000,
+                    'p99_ms': p[99] * 1000,
+                    'total_s': histograma.suma,
+                })
+            errores = [{'etapa': etapa, 'tipo': tipo, 'cuenta': n} for (etapa, tipo), n in sorted(self._errores.items())]
+            return {'etapas': etapas, 'eventos': dict(sorted(self._eventos.items())), 'errores': errores}
+
+    @staticmethod
+    def _etiquetas(**etiquetas) -> str:
+        escapar = lambda v: str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in etiquetas.items()) + "}"
+
+    def texto_prometheus(self) -> str:
+        p = self.PREFIJO
+        lineas = [
+            f"# HELP {p}_etapa_segundos Latencia por etapa.",
+            f"# TYPE {p}_etapa_segundos histogram",
+        ]
+        with self._lock:
+            percentiles = []
+            for etapa, histograma in sorted(self._latencias.items()):
+                acumulado = 0
+                for limite, n in zip(HistogramaLatencias.CUBETAS + ('+Inf',), histograma.cubetas):
+                    acumulado += n
+                    lineas.append(f"{p}_etapa_segundos_bucket{self._etiquetas(etapa=etapa, le=limite)} {acumulado}")
+                lineas.append(f"{p}_etapa_segundos_sum{self._etiquetas(etapa=etapa)} {histograma.suma:.6f}")
+                lineas.append(f"{p}_etapa_segundos_count{self._etiquetas(etapa=etapa)} {histograma.cuenta}")
+                for q, valor in histograma.percentiles().items():
+                    percentiles.append(f"{p}_etapa_percentil_segundos{self._etiquetas(etapa=etapa, quantile=q / 100)} {valor:.6f}")
+
+            lineas += [f"# HELP {p}_etapa_percentil_segundos Percentiles de las últimas {HistogramaLatencias().recientes.maxlen} observaciones.",
+                       f"# TYPE {p}_etapa_percentil_segundos gauge"] + percentiles
+            lineas += [f"# HELP {p}_eventos_total Eventos contados por el proceso.",
+                       f"# TYPE {p}_eventos_total counter"]
+            lineas += [f"{p}_eventos_total{self._etiquetas(evento=e)} {n}" for e, n in sorted(self._eventos.items())]
+            lineas += [f"# HELP {p}_errores_total Errores por etapa y tipo de excepción.",
+                       f"# TYPE {p}_errores_total counter"]
+            lineas += [f"{p}_errores_total{self._etiquetas(etapa=e, tipo=t)} {n}" for (e, t), n in sorted(self._errores.items())]
+        lineas += [f"# HELP {p}_inicio_proceso_segundos Hora de arranque del proceso (epoch).",
+                   f"# TYPE {p}_inicio_proceso_segundos gauge",
+                   f"{p}_inicio_proceso_segundos {self.inicio:.0f}"]
+        return "\n".join(lineas) + "\n"
+
+    def exportar(self):
+        """Reescribe ``ruta`` de forma atómica (el colector nunca lee un archivo a medias)."""
+        if self.ruta is None:
+            return
+        try:
+            self.ruta.parent.mkdir(exist_ok=True)
+            temporal = self.ruta.with_suffix('.prom.tmp')
+            temporal.write_text(self.texto_prometheus(), encoding='utf-8')
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            registro.warning("No se pudieron exportar las métricas: %s", e)
+
+    def exportar_periodicamente(self, intervalo: float = 15.0):
+        exportados = None
+        while True:
+            time.sleep(intervalo)
+            if self._cambios != exportados:
+                exportados = self._cambios
+                self.exportar()
+
+
+@recurso_compartido()
+def obtener_metricas() -> Metricas:
+    """Registro único por proceso; sólo acumula en memoria (importar la app no escribe nada)."""
+    return Metricas()
+
+
+METRICAS = obtener_metricas()
+
+
+@recurso_compartido()
+def exportar_metricas(ruta: Path = Path("data") / "metricas.prom") -> Path:
+    """Vuelca ``METRICAS`` a ``ruta`` cada 15 s y al salir; lo arrancan ``main`` y ``cli``."""
+    METRICAS.ruta = ruta.resolve()  # atexit puede correr con otro directorio actual
+    threading.Thread(target=METRICAS.exportar_periodicamente, name="metricas", daemon=True).start()
+    atexit.register(METRICAS.exportar)
+    return METRICAS.ruta
+
 # ==================== CONFIGURACIÓN DE STREAMLIT SECRETS ====================
+def leer_secretos_locales() -> Dict:
+    """``secrets.toml`` del proyecto o del usuario, como lo buscaría Streamlit."""
+    for ruta in (Path(".streamlit") / "secrets.toml", Path.home() / ".streamlit" / "secrets.toml"):
+        if ruta.exists():
+            with open(ruta, 'rb') as f:
+                return tomllib.load(f)
+    return {}
+
+
 class Config:
-    def __init__(self):
+    """Configuración de la app; los secretos se leen de ``st.secrets`` al primer uso.
+
+    Así una recarga que no envía correo ni toca el servidor remoto no resuelve
+    (ni exige) sus credenciales. Cada valor queda memorizado en la instancia.
+    Sin interfaz se usa la variable de entorno con el nombre del atributo
+    (``SMTP_SERVER``, ``REMOTE_HOST``...) o, si no existe, ``secrets.toml``.
+    """
+
+    SECRETOS = {
         # Configuración SMTP
-        self.SMTP_SERVER = st.secrets["smtp_server"]
-        self.SMTP_PORT = st.secrets["smtp_port"]
-        self.EMAIL_USER = st.secrets["email_user"]
-        self.EMAIL_PASSWORD = st.secrets["email_password"].replace(" ", "")
-        self.NOTIFICATION_EMAIL = st.secrets["notification_email"]
-        
+        'SMTP_SERVER': 'smtp_server',
+        'SMTP_PORT': 'smtp_port',
+        'EMAIL_USER': 'email_user',
+        'EMAIL_PASSWORD': 'email_password',
+        'NOTIFICATION_EMAIL': 'notification_email',
         # Configuración remota
-        self.REMOTE_HOST = st.secrets["remote_host"]
-        self.REMOTE_USER = st.secrets["remote_user"]
-        self.REMOTE_PASSWORD = st.secrets["remote_password"]
-        self.REMOTE_PORT = st.secrets["remote_port"]
-        self.REMOTE_DIR = st.secrets["remote_dir"]
-        self.REMOTE_FILE = st.secrets["remote_file"]
-        
-        # Configuración adicional
-        self.MAX_FILE_SIZE_MB = 10
-        self.TIMEOUT_SECONDS = 30
+        'REMOTE_HOST': 'remote_host',
+        'REMOTE_USER': 'remote_user',
+        'REMOTE_PASSWORD': 'remote_password',
+        'REMOTE_PORT': 'remote_port',
+        'REMOTE_DIR': 'remote_dir',
+        'REMOTE_FILE': 'remote_file',
+    }
+
+    # Configuración adicional
+    MAX_FILE_SIZE_MB = 10
+    TIMEOUT_SECONDS = 30
+
+    def __getattr__(self, nombre):
+        if nombre not in self.SECRETOS:
+            raise AttributeError(nombre)
+        if not MODO_HEADLESS:
+            valor = st.secrets[self.SECRETOS[nombre]]
+        elif nombre in os.environ:
+            valor = os.environ[nombre]
+            if nombre.endswith('_PORT'):
+                valor = int(valor)
+        else:
+            if '_locales' not in self.__dict__:
+                self._locales = leer_secretos_locales()
+            valor = self._locales[self.SECRETOS[nombre]]
+        if nombre == 'EMAIL_PASSWORD':
+            valor = valor.replace(" ", "")
+        setattr(self, nombre, valor)
+        return valor
 
 CONFIG = Config()
 
@@ -65,142 +390,1594 @@ def clean_name(name):
     return ' '.join(word.capitalize() for word in name.split())
 
 # ==================== FUNCIONES SSH/SFTP ====================
-class SSHManager:
-    @staticmethod
-    def get_connection():
+class ConexionSFTPError(Exception):
+    """No fue posible abrir una sesión SSH/SFTP con el servidor remoto."""
+
+
+class SFTPPool:
+    """Pool de sesiones SFTP persistentes, compartido por todo el proceso.
+
+    Evita repetir el handshake TCP + SSH + autenticación en cada operación:
+    las sesiones se reutilizan entre reruns y entre sesiones de Streamlit,
+    envían keepalives y se reemplazan solas cuando el transporte muere.
+    """
+
+    def __init__(self, host, port, usuario, password, timeout,
+                 max_sesiones=4, keepalive=30, max_inactividad=300):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.password = password
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.max_inactividad = max_inactividad
+        self._libres = []
+        self._lock = threading.Lock()
+        self._semaforo = threading.BoundedSemaphore(max_sesiones)
+
+    def _conectar(self):
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         try:
-            ssh.connect(
-                hostname=CONFIG.REMOTE_HOST,
-                port=CONFIG.REMOTE_PORT,
-                username=CONFIG.REMOTE_USER,
-                password=CONFIG.REMOTE_PASSWORD,
-                timeout=CONFIG.TIMEOUT_SECONDS
-            )
-            return ssh
+            with METRICAS.medir('sftp_conexion'):
+                ssh.connect(
+                    hostname=self.host,
+                    port=self.port,
+                    username=self.usuario,
+                    password=self.password,
+                    timeout=self.timeout
+                )
+                ssh.get_transport().set_keepalive(self.keepalive)
+                return ssh, ssh.open_sftp()
         except Exception as e:
-            st.error(f"Error de conexión SSH: {str(e)}")
-            return None
+            ssh.close()
+            raise ConexionSFTPError(str(e)) from e
 
     @staticmethod
-    def get_remote_file(remote_path):
-        ssh = SSHManager.get_connection()
-        if not ssh:
-            return None
-        
+    def _activa(ssh):
+        transporte = ssh.get_transport()
+        return transporte is not None and transporte.is_active()
+
+    def _tomar(self):
+        with self._lock:
+            while self._libres:
+                ssh, sftp, ultimo_uso = self._libres.pop()
+                if self._activa(ssh) and time.monotonic() - ultimo_uso < self.max_inactividad:
+                    return ssh, sftp
+                ssh.close()
+        return self._conectar()
+
+    def _devolver(self, ssh, sftp):
+        with self._lock:
+            self._libres.append((ssh, sftp, time.monotonic()))
+
+    def ejecutar(self, operacion):
+        """Ejecuta ``operacion(sftp)`` en una sesión del pool.
+
+        Si el transporte muere a mitad de la operación, la sesión se descarta
+        y se reintenta una vez sobre una conexión nueva.
+        """
+        with self._semaforo:
+            for intento in range(2):
+                ssh, sftp = self._tomar()
+                try:
+                    resultado = operacion(sftp)
+                except Exception:
+                    if self._activa(ssh):
+                        self._devolver(ssh, sftp)
+                        raise
+                    ssh.close()
+                    if intento:
+                        raise
+                    continue
+                self._devolver(ssh, sftp)
+                return resultado
+
+    def cerrar(self):
+        with self._lock:
+            for ssh, _, _ in self._libres:
+                ssh.close()
+            self._libres.clear()
+
+
+@recurso_compartido()
+def obtener_pool_sftp(host, port, usuario, password, timeout) -> SFTPPool:
+    """Un pool por destino y credenciales, vivo mientras viva el proceso."""
+    return SFTPPool(host, port, usuario, password, timeout)
+
+
+class SSHManager:
+    @staticmethod
+    def get_pool() -> SFTPPool:
+        return obtener_pool_sftp(
+            CONFIG.REMOTE_HOST,
+            CONFIG.REMOTE_PORT,
+            CONFIG.REMOTE_USER,
+            CONFIG.REMOTE_PASSWORD,
+            CONFIG.TIMEOUT_SECONDS
+        )
+
+    @staticmethod
+    def ejecutar(operacion):
+        """Ejecuta ``operacion(sftp)`` sobre el pool; None si no hay conexión."""
         try:
-            sftp = ssh.open_sftp()
-            with sftp.file(remote_path, 'r') as f:
-                content = f.read().decode('utf-8')
-            return content
-        except Exception as e:
+            return SSHManager.get_pool().ejecutar(operacion)
+        except ConexionSFTPError as e:
+            avisar(f"Error de conexión SSH: {str(e)}")
             return None
-        finally:
-            ssh.close()
 
     @staticmethod
     def file_exists(remote_path):
-        ssh = SSHManager.get_connection()
-        if not ssh:
-            return False
-        
         try:
-            sftp = ssh.open_sftp()
-            sftp.stat(remote_path)
-            return True
-        except:
+            return SSHManager.ejecutar(lambda sftp: sftp.stat(remote_path)) is not None
+        except FileNotFoundError:
+            # Que el archivo aún no exista es una respuesta, no un error del SFTP
+            return False
+        except Exception as e:
+            METRICAS.error('sftp_stat', e)
             return False
-        finally:
-            ssh.close()
 
 # ==================== FUNCIONES DE ARCHIVOS REMOTOS ====================
-def obtener_interesados_activos():
-    remote_path = os.path.join(CONFIG.REMOTE_DIR, CONFIG.REMOTE_FILE)
-    
-    if not SSHManager.file_exists(remote_path):
-        return []
-    
-    csv_content = SSHManager.get_remote_file(remote_path)
-    if not csv_content:
-        return []
+class CacheInteresados:
+    """Listas de interesados ya parseadas, validadas contra mtime y tamaño remotos.
 
-    interesados = []
-    lines = csv_content.splitlines()
-    
-    if not lines:
-        return []
-    
-    headers = [h.strip().lower() for h in lines[0].split(',')]
-    
-    for line in lines[1:]:
-        if not line.strip():
-            continue
-            
+    Política de desalojo: como máximo ``max_entradas`` archivos (LRU) y ninguna
+    entrada vive más de ``max_edad`` segundos, aunque el stat coincida, para
+    cubrir ediciones que no cambian ni el tamaño ni el mtime (resolución de 1 s).
+    """
+
+    def __init__(self, max_entradas=4, max_edad=3600):
+        self.max_entradas = max_entradas
+        self.max_edad = max_edad
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, ruta, mtime, size):
+        with self._lock:
+            entrada = self._entradas.get(ruta)
+            if entrada is None:
+                return None
+            mtime_cache, size_cache, interesados, guardado = entrada
+            if (mtime_cache, size_cache) != (mtime, size) or time.monotonic() - guardado > self.max_edad:
+                del self._entradas[ruta]
+                return None
+            self._entradas.move_to_end(ruta)
+            return interesados
+
+    def guardar(self, ruta, mtime, size, interesados):
+        with self._lock:
+            self._entradas[ruta] = (mtime, size, interesados, time.monotonic())
+            self._entradas.move_to_end(ruta)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, ruta=None):
+        with self._lock:
+            if ruta is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(ruta, None)
+
+
+@recurso_compartido()
+def obtener_cache_interesados() -> CacheInteresados:
+    return CacheInteresados()
+
+
+class ArchivoDemasiadoGrandeError(ValueError):
+    """El archivo remoto excede ``CONFIG.MAX_FILE_SIZE_MB``."""
+
+
+TAMANO_FRAGMENTO = 64 * 1024
+
+
+# Lecturas SFTP por adelantado: la ventana siguiente se pide mientras se
+# consume la actual, así que en memoria nunca hay más de dos. Las ventanas
+# empiezan chicas y se duplican hasta VENTANA_SFTP.
+VENTANA_SFTP = 1024 * 1024
+VENTANA_SFTP_INICIAL = 64 * 1024
+
+
+def leer_con_anticipacion(archivo, tamano_total: int, tamano: int = TAMANO_FRAGMENTO):
+    """Lee un archivo SFTP por ventanas, con la siguiente ya pedida al servidor.
+
+    ``prefetch(fin)`` encola en paralelo las lecturas de 32 KB desde la
+    posición actual hasta ``fin``. paramiko da el prefetch por terminado en
+    cuanto no le quedan peticiones en vuelo, y si el lector se las acaba
+    antes de que su hilo encole las siguientes, el resto se lee con un viaje
+    de ida y vuelta por bloque (~10 veces más lento). Con la ventana
+    siguiente encolada desde antes, eso sólo puede pasar en la primera, que
+    por eso es chica.
+    """
+    inicio, fin = 0, min(VENTANA_SFTP_INICIAL, tamano_total)
+    archivo.prefetch(fin)
+    while inicio < tamano_total:
+        siguiente = min(fin + min(2 * (fin - inicio), VENTANA_SFTP), tamano_total)
+        if fin < tamano_total:
+            archivo.seek(fin)
+            archivo.prefetch(siguiente)
+            archivo.seek(inicio)
+        restante = fin - inicio
+        while restante > 0:
+            bloque = archivo.read(min(tamano, restante))
+            if not bloque:
+                return
+            restante -= len(bloque)
+            yield bloque
+        inicio, fin = fin, siguiente
+
+
+def leer_fragmentos(archivo, max_bytes: int, tamano: int = TAMANO_FRAGMENTO,
+                    cronometro: Optional[Cronometro] = None, tamano_total: Optional[int] = None):
+    """Genera bloques de bytes del archivo sin superar ``max_bytes`` en total.
+
+    Con ``tamano_total`` (archivos SFTP, tamaño del ``stat``) se lee con
+    ``leer_con_anticipacion``.
+    Con ``cronometro`` se acumula sólo el tiempo de lectura, aparte del de
+    quien consume los bloques.
+    """
+    cronometro = cronometro or Cronometro()
+    if tamano_total is None:
+        bloques = iter(lambda: archivo.read(tamano), b'')
+    else:
+        bloques = leer_con_anticipacion(archivo, tamano_total, tamano)
+    leidos = 0
+    while True:
+        with cronometro:
+            bloque = next(bloques, b'')
+        if not bloque:
+            return
+        leidos += len(bloque)
+        if leidos > max_bytes:
+            raise ArchivoDemasiadoGrandeError(f"{leidos} bytes > {max_bytes} bytes")
+        yield bloque
+
+
+def decodificar_lineas(fragmentos, encoding: str = 'utf-8-sig'):
+    """Decodifica los bloques de forma incremental y genera líneas completas.
+
+    Sólo se corta en ``\\n`` (conservándolo) para que ``csv.reader`` pueda
+    reconstruir los campos entrecomillados que contienen saltos de línea.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pendiente = ''
+    for bloque in fragmentos:
+        texto = pendiente + decoder.decode(bloque)
+        inicio = 0
+        while True:
+            fin = texto.find('\n', inicio)
+            if fin < 0:
+                break
+            yield texto[inicio:fin + 1]
+            inicio = fin + 1
+        pendiente = texto[inicio:]
+    pendiente += decoder.decode(b'', final=True)
+    if pendiente:
+        yield pendiente
+
+
+def iterar_interesados(lineas):
+    """Genera, uno a uno, los interesados activos y válidos de un CSV (RFC 4180).
+
+    Cada interesado es una tupla en el orden de ``COLUMNAS_PADRON``.
+    """
+    lector = csv.reader(lineas)
+    try:
+        encabezados = next(lector)
+    except (StopIteration, csv.Error):
+        return
+    headers = [h.strip().lower() for h in encabezados]
+
+    while True:
         try:
-            parts = [p.strip() for p in line.split(',')]
-            if len(parts) < 2:
-                continue
-                
-            registro = {}
-            for i, header in enumerate(headers):
-                if i < len(parts):
-                    registro[header] = parts[i].strip()
-            
-            nombre = clean_name(registro.get('nombre completo', ''))
-            email = registro.get('correo electronico', '').lower()
-            estado = registro.get('estado', '').capitalize()
-            especialidad = registro.get('especialidad', 'No especificada')
-            
-            if validate_email(email) and estado == 'Activo':
-                interesados.append({
-                    'nombre': nombre,
-                    'email': email,
-                    'estado': estado,
-                    'especialidad': especialidad,
-                    'fecha': registro.get('fecha', '')
-                })
-        except:
+            parts = next(lector)
+        except StopIteration:
+            return
+        except csv.Error:
             continue
-            
-    return interesados
 
-# ==================== FUNCIONES DE ENVÍO DE CORREOS ====================
-def enviar_correo(destinatario, asunto, mensaje, adjunto=None):
-    if not destinatario or not asunto or not mensaje:
-        return False
+        if len(parts) < 2:
+            continue
+
+        registro = {}
+        for i, header in enumerate(headers):
+            if i < len(parts):
+                registro[header] = parts[i].strip()
+
+        nombre = clean_name(registro.get('nombre completo', ''))
+        email = registro.get('correo electronico', '').lower()
+        estado = registro.get('estado', '').capitalize()
+        especialidad = registro.get('especialidad', 'No especificada')
+
+        if validate_email(email) and estado == 'Activo':
+            yield nombre, email, especialidad, estado, registro.get('fecha', '')
+
+
+COLUMNAS_PADRON = ('nombre', 'email', 'especialidad', 'estado', 'fecha')
+CATEGORICAS_PADRON = ('especialidad', 'estado', 'fecha')
+
+
+def construir_padron(filas, lote: int = 16384) -> pd.DataFrame:
+    """Padrón columnar a partir de tuplas en el orden de ``COLUMNAS_PADRON``.
+
+    Nombre y email quedan como cadenas Arrow (un búfer y sus offsets por
+    columna, sin un ``str`` por fila) y especialidad, estado y fecha como
+    categóricas: 100k interesados ocupan ~5 MB en vez de ~50 MB como lista
+    de dicts. Las filas se empaquetan por lotes, así que el pico del parseo
+    tampoco crece con el archivo. Un email repetido conserva su primera
+    aparición; el índice es la posición (0..n-1).
+    """
+    trozos = {columna: [] for columna in COLUMNAS_PADRON}
+    filas = iter(filas)
+    while True:
+        bloque = list(itertools.islice(filas, lote))
+        if not bloque:
+            break
+        for columna, valores in zip(COLUMNAS_PADRON, zip(*bloque)):
+            trozos[columna].append(pa.array(valores, type=pa.string()))
+
+    columnas = {}
+    for columna, arreglos in trozos.items():
+        cadenas = pa.chunked_array(arreglos, type=pa.string())
+        if columna in CATEGORICAS_PADRON:
+            columnas[columna] = cadenas.dictionary_encode().to_pandas()
+        else:
+            columnas[columna] = pd.arrays.ArrowStringArray(cadenas)
+    padron = pd.DataFrame(columnas)
+    repetidos = padron['email'].duplicated()
+    if repetidos.any():
+        padron = padron[~repetidos].reset_index(drop=True)
+    return padron
+
+
+def marcar_emails(padron: pd.DataFrame, emails) -> np.ndarray:
+    """Máscara de las filas de ``padron`` cuyo email está en ``emails``.
+
+    Se resuelve en Arrow (``Series.isin`` sobre cadenas Arrow es ~20 veces
+    más lento), sin crear un ``str`` por fila.
+    """
+    if not len(padron) or not len(emails):
+        return np.zeros(len(padron), dtype=bool)
+    conjunto = pa.array(list(emails), type=pa.string())
+    return pa.compute.is_in(pa.array(padron['email'].array), value_set=conjunto).to_numpy(zero_copy_only=False)
+
+
+def obtener_interesados_activos(forzar: bool = False) -> pd.DataFrame:
+    """Devuelve el padrón (``construir_padron``) de interesados activos del archivo remoto.
+
+    Si el mtime y el tamaño remotos coinciden con la última descarga, se
+    reutiliza la lista ya parseada y la carga cuesta un solo ``stat``.
+    ``forzar=True`` invalida la cache y vuelve a descargar el archivo, que se
+    lee por bloques y se parsea en streaming sin superar MAX_FILE_SIZE_MB.
+    El padrón devuelto es compartido entre sesiones: no debe modificarse.
+    Si no se pudo cargar, el padrón está vacío.
+    """
+    remote_path = os.path.join(CONFIG.REMOTE_DIR, CONFIG.REMOTE_FILE)
+    cache = obtener_cache_interesados()
+    max_bytes = CONFIG.MAX_FILE_SIZE_MB * 1024 * 1024
+    if forzar:
+        cache.invalidar(remote_path)
+
+    def cargar(sftp):
+        with METRICAS.medir('sftp_stat'):
+            atributos = sftp.stat(remote_path)
+        interesados = cache.obtener(remote_path, atributos.st_mtime, atributos.st_size)
+        if interesados is not None:
+            METRICAS.contar('padron_cache_aciertos')
+            return interesados
+        if atributos.st_size > max_bytes:
+            raise ArchivoDemasiadoGrandeError(f"{atributos.st_size} bytes > {max_bytes} bytes")
+        lectura = Cronometro()
+        inicio = time.perf_counter()
+        with sftp.open(remote_path, 'rb') as f:
+            fragmentos = leer_fragmentos(f, max_bytes, cronometro=lectura, tamano_total=atributos.st_size)
+            lineas = decodificar_lineas(fragmentos)
+            interesados = construir_padron(iterar_interesados(lineas))
+        METRICAS.observar('sftp_lectura', lectura.segundos)
+        METRICAS.observar('padron_parseo', time.perf_counter() - inicio - lectura.segundos)
+        METRICAS.contar('padron_filas', len(interesados))
+        cache.guardar(remote_path, atributos.st_mtime, atributos.st_size, interesados)
+        return interesados
 
     try:
-        msg = MIMEMultipart()
-        msg['From'] = CONFIG.EMAIL_USER
-        msg['To'] = destinatario
-        msg['Subject'] = asunto
-        msg.attach(MIMEText(mensaje, 'plain'))
-
-        if adjunto:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(adjunto.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename="{adjunto.name}"')
-            msg.attach(part)
+        padron = SSHManager.ejecutar(cargar)
+        if padron is not None:
+            return padron
+    except ArchivoDemasiadoGrandeError as e:
+        METRICAS.error('padron_carga', e)
+        avisar(f"El archivo de interesados excede {CONFIG.MAX_FILE_SIZE_MB} MB")
+    except Exception as e:
+        METRICAS.error('padron_carga', e)
+    return construir_padron(())
+
+# ==================== FUNCIONES DE ENVÍO DE CORREOS ====================
+class SesionSMTP:
+    """Sesión SMTP autenticada que se reutiliza durante toda una campaña.
 
+    STARTTLS y login se hacen una sola vez; cada correo sólo paga el
+    intercambio MAIL/RCPT/DATA. La sesión se recicla cada ``max_mensajes``
+    envíos, y también si el servidor responde 421 o corta la conexión
+    (en ese caso el mensaje se reintenta una vez en una sesión nueva).
+    """
+
+    def __init__(self, max_mensajes=100, timeout=30):
+        self.max_mensajes = max_mensajes
+        self.timeout = timeout
+        self._server = None
+        self._enviados = 0
+
+    def abrir(self):
         context = ssl.create_default_context()
-        with smtplib.SMTP(CONFIG.SMTP_SERVER, CONFIG.SMTP_PORT, timeout=30) as server:
-            server.starttls(context=context)
-            server.login(CONFIG.EMAIL_USER, CONFIG.EMAIL_PASSWORD)
-            server.send_message(msg)
+        with METRICAS.medir('smtp_conexion'):
+            server = smtplib.SMTP(CONFIG.SMTP_SERVER, CONFIG.SMTP_PORT, timeout=self.timeout)
+        try:
+            with METRICAS.medir('smtp_starttls'):
+                server.starttls(context=context)
+            with METRICAS.medir('smtp_login'):
+                server.login(CONFIG.EMAIL_USER, CONFIG.EMAIL_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._enviados = 0
 
+    def cerrar(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
+
+    def _descartar(self):
+        if self._server is not None:
+            self._server.close()
+        self._server = None
+
+    def _transmitir(self, msg, destinatarios):
+        with METRICAS.medir('smtp_data'):
+            if isinstance(msg, bytes):
+                self._server.sendmail(CONFIG.EMAIL_USER, destinatarios, msg)
+            else:
+                self._server.send_message(msg)
+
+    def _reabrir(self):
+        METRICAS.contar('smtp_reconexiones')
+        self._descartar()
+        self.abrir()
+
+    def _ejecutar(self, transaccion):
+        if self._server is None or self._enviados >= self.max_mensajes:
+            self.cerrar()
+            self.abrir()
+        try:
+            resultado = transaccion()
+        except smtplib.SMTPServerDisconnected:
+            self._reabrir()
+            resultado = transaccion()
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code != 421:
+                raise
+            self._reabrir()
+            resultado = transaccion()
+        self._enviados += 1
+        return resultado
+
+    def enviar(self, msg, destinatarios=None):
+        """Envía un ``Message`` o, si ``msg`` ya son bytes, a ``destinatarios``."""
+        self._ejecutar(lambda: self._transmitir(msg, destinatarios))
+
+    def _sobre(self, msg: bytes, destinatarios: List[str]) -> Dict[str, tuple]:
+        """Una transacción MAIL/RCPT.../DATA; devuelve ``{email: (código, respuesta)}`` de los RCPT rechazados.
+
+        Si el servidor anuncia PIPELINING, MAIL y todos los RCPT salen en una
+        sola escritura y las respuestas se leen después, en orden (RFC 2920).
+        """
+        server = self._server
+        with METRICAS.medir('smtp_sobre'):
+            server.ehlo_or_helo_if_needed()
+            comandos = [f"MAIL FROM:{smtplib.quoteaddr(CONFIG.EMAIL_USER)}\r\n"]
+            comandos += [f"RCPT TO:{smtplib.quoteaddr(d)}\r\n" for d in destinatarios]
+            respuestas = []
+            if server.has_extn('pipelining'):
+                server.send("".join(comandos))
+                respuestas = [server.getreply() for _ in comandos]
+            else:
+                for comando in comandos:
+                    server.send(comando)
+                    respuestas.append(server.getreply())
+                    if respuestas[0][0] != 250:
+                        break
+
+            codigo, respuesta = respuestas[0]
+            if codigo != 250:
+                if codigo == 421:
+                    server.close()
+                else:
+                    server.rset()
+                raise smtplib.SMTPSenderRefused(codigo, respuesta, CONFIG.EMAIL_USER)
+            rechazados = {d: r for d, r in zip(destinatarios, respuestas[1:]) if r[0] not in (250, 251)}
+            if any(codigo == 421 for codigo, _ in rechazados.values()):
+                server.close()
+                raise smtplib.SMTPResponseException(421, b"servicio no disponible")
+            if len(rechazados) == len(destinatarios):
+                server.rset()
+                return rechazados
+            codigo, respuesta = server.data(msg)
+            if codigo != 250:
+                raise smtplib.SMTPDataError(codigo, respuesta)
+            return rechazados
+
+    def enviar_lote(self, msg: bytes, destinatarios: List[str]) -> Dict[str, tuple]:
+        """Envía ``msg`` a todos los ``destinatarios`` con el menor número de sobres.
+
+        Si el servidor limita los destinatarios por mensaje (452 en algunos
+        RCPT), los que no cupieron pasan a un sobre nuevo y los siguientes
+        sobres se acotan a lo que el servidor sí aceptó. Devuelve los
+        rechazos definitivos, ``{email: (código, respuesta)}``.
+        """
+        rechazados = {}
+        pendientes = list(destinatarios)
+        limite = len(pendientes)
+        while pendientes:
+            sobre, pendientes = pendientes[:limite], pendientes[limite:]
+            resultado = self._ejecutar(lambda: self._sobre(msg, sobre))
+            excedidos = [d for d in sobre if d in resultado and resultado[d][0] == 452]
+            aceptados = len(sobre) - len(resultado)
+            if excedidos and aceptados:
+                METRICAS.contar('smtp_sobres_divididos')
+                limite = aceptados
+                pendientes = excedidos + pendientes
+                for d in excedidos:
+                    resultado.pop(d, None)
+            rechazados.update(resultado)
+        return rechazados
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+
+class Fallo:
+    """Un envío que no se concretó, ya clasificado.
+
+    Es falso en contexto booleano, así que ``if ok`` sigue funcionando donde
+    antes había un ``False``. Un fallo ``permanente`` (5xx) no se reintenta;
+    uno transitorio (4xx, corte o timeout) sí. ``del_buzon`` indica que la
+    dirección misma no existe: va a la lista de rebotes. ``de_campana``, que
+    el problema es del envío entero (relay, credenciales, remitente o el
+    mensaje) y no de un destinatario: la campaña se detiene.
+    """
+
+    __slots__ = ('codigo', 'detalle', 'permanente', 'del_buzon', 'de_campana')
+
+    # Código de estado extendido (RFC 3463) al inicio de la respuesta, p. ej. "5.1.1"
+    ESTADO_EXTENDIDO = re.compile(r'\s*[245]\.(\d{1,3})\.(\d{1,3})\b')
+
+    def __init__(self, codigo: Optional[int], detalle: str, permanente: bool, del_buzon: bool = False,
+                 de_campana: bool = False):
+        self.codigo = codigo
+        self.detalle = detalle
+        self.permanente = permanente
+        self.del_buzon = del_buzon
+        self.de_campana = de_campana
+
+    @staticmethod
+    def _texto(respuesta) -> str:
+        if isinstance(respuesta, bytes):
+            return respuesta.decode('utf-8', 'replace')
+        return str(respuesta)
+
+    @classmethod
+    def de_respuesta(cls, codigo: int, respuesta) -> 'Fallo':
+        """Respuesta a la conexión, AUTH, MAIL o DATA: un 5xx ahí vale para todos los destinatarios."""
+        permanente = codigo >= 500
+        return cls(codigo, cls._texto(respuesta), permanente, de_campana=permanente)
+
+    @classmethod
+    def de_rcpt(cls, codigo: int, respuesta) -> 'Fallo':
+        """Respuesta a un RCPT TO.
+
+        Sólo un 550/551/553 con estado 5.1.x de la dirección de destino cuenta
+        como buzón inexistente; sin estado extendido, sólo 551 y 553. Un 5.7.x
+        (relay denegado, remitente no autorizado, política), un 5.1.7/5.1.8
+        (dirección del remitente) o un 554 sin estado es de la campaña. Un 552 en
+        RCPT (demasiados destinatarios) se trata como temporal, RFC 5321
+        §4.5.3.1.10.
+        """
+        respuesta = cls._texto(respuesta)
+        if codigo < 500 or codigo == 552:
+            return cls(codigo, respuesta, permanente=False)
+        estado = cls.ESTADO_EXTENDIDO.match(respuesta)
+        if estado is None:
+            return cls(codigo, respuesta, True, del_buzon=codigo in (551, 553), de_campana=codigo == 554)
+        tema, detalle = int(estado.group(1)), int(estado.group(2))
+        del_remitente = tema == 1 and detalle in (7, 8)
+        del_buzon = codigo in (550, 551, 553) and tema == 1 and not del_remitente
+        return cls(codigo, respuesta, True, del_buzon=del_buzon, de_campana=tema == 7 or del_remitente)
+
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return f"{self.codigo} {self.detalle}" if self.codigo else self.detalle
+
+    def __repr__(self):
+        tipo = 'de campaña' if self.de_campana else 'permanente' if self.permanente else 'transitorio'
+        return f"<Fallo {tipo} {self}>"
+
+
+class CampanaDetenida(Exception):
+    """Un fallo de la campaña entera (``Fallo.de_campana``): seguir sólo repetiría el rechazo."""
+
+    def __init__(self, fallo: Fallo):
+        super().__init__(str(fallo))
+        self.fallo = fallo
+
+
+def clasificar_fallo(error: Exception) -> Fallo:
+    """Fallo transitorio, permanente o de campaña según la excepción con que terminó un envío."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Los envíos individuales llevan un solo destinatario
+        codigo, respuesta = next(iter(error.recipients.values()))
+        return Fallo.de_rcpt(codigo, respuesta)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return Fallo.de_respuesta(error.smtp_code, error.smtp_error)
+    if isinstance(error, smtplib.SMTPNotSupportedError):
+        return Fallo(None, str(error), permanente=True, de_campana=True)
+    if isinstance(error, OSError):
+        # Corte de conexión, timeout o TLS: el relay puede volver
+        return Fallo(None, f"{type(error).__name__}: {error}", permanente=False)
+    return Fallo(None, f"{type(error).__name__}: {error}", permanente=True)
+
+
+class PlantillaCorreo:
+    """Correo de campaña renderizado una sola vez.
+
+    Cabeceras comunes, cuerpo (quoted-printable) y adjunto (base64) se
+    codifican al crear la plantilla; por destinatario sólo se generan la
+    cabecera ``To`` y el saludo personalizado.
+    """
+
+    SALUDO = "Estimado(a) {nombre}:\n\n"
+
+    def __init__(self, asunto: str, mensaje: str, adjunto_nombre: Optional[str] = None,
+                 adjunto_datos: Optional[bytes] = None, saludo: Optional[str] = SALUDO):
+        self.saludo = saludo
+        self._frontera = f"=============={uuid.uuid4().hex}=="
+        # Sin dominio, make_msgid consulta getfqdn() (DNS) en cada mensaje
+        self._dominio = CONFIG.EMAIL_USER.rpartition('@')[2] or socket.getfqdn()
+        # Los asuntos largos se pliegan en varias líneas: con CRLF, nunca con un LF suelto
+        asunto_codificado = email.header.Header(asunto, 'utf-8').encode(linesep='\r\n')
+        self._cabecera = (
+            f"From: {CONFIG.EMAIL_USER}\r\n"
+            f"Subject: {asunto_codificado}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/mixed; boundary="{self._frontera}"\r\n'
+        ).encode('ascii')
+        self._inicio_texto = (
+            f"\r\n--{self._frontera}\r\n"
+            'Content-Type: text/plain; charset="utf-8"\r\n'
+            "Content-Transfer-Encoding: quoted-printable\r\n\r\n"
+        ).encode('ascii')
+        self._cuerpo = self._codificar_texto(mensaje)
+
+        self._adjunto = b""
+        if adjunto_datos is not None:
+            part = email.mime.base.MIMEBase('application', 'octet-stream')
+            part.set_payload(adjunto_datos)
+            email.encoders.encode_base64(part)
+            part.add_header('Content-Disposition', 'attachment', filename=adjunto_nombre or 'adjunto')
+            self._adjunto = f"\r\n--{self._frontera}\r\n".encode('ascii') + part.as_bytes(policy=email.policy.SMTP)
+        self._cierre = f"\r\n--{self._frontera}--\r\n".encode('ascii')
+
+    @staticmethod
+    def _codificar_texto(texto: str) -> bytes:
+        # quoprimime trabaja sobre caracteres de un byte: se le pasa el UTF-8 como latin-1
+        return email.quoprimime.body_encode(texto.encode('utf-8').decode('latin-1'), eol='\r\n').encode('ascii')
+
+    def renderizar(self, destinatario: str, nombre: Optional[str] = None) -> bytes:
+        saludo = b""
+        if self.saludo and nombre is not None:
+            saludo = self._codificar_texto(self.saludo.format(nombre=nombre))
+        return b"".join((
+            self._cabecera,
+            f"To: {destinatario}\r\nDate: {email.utils.formatdate(localtime=True)}\r\nMessage-ID: {email.utils.make_msgid(domain=self._dominio)}\r\n".encode('ascii'),
+            self._inicio_texto,
+            saludo,
+            self._cuerpo,
+            self._adjunto,
+            self._cierre,
+        ))
+
+    def enviar(self, sesion: 'SesionSMTP', destinatario: str, nombre: Optional[str] = None) -> 'bool | Fallo':
+        """True si el servidor aceptó el correo; si no, el ``Fallo`` clasificado."""
+        try:
+            sesion.enviar(self.renderizar(destinatario, nombre), [destinatario])
+        except Exception as e:
+            # El tipo de error ya quedó contado en la etapa SMTP donde ocurrió
+            METRICAS.contar('correos_fallidos')
+            return clasificar_fallo(e)
+        METRICAS.contar('correos_enviados')
         return True
-    except:
+
+    def renderizar_lote(self) -> bytes:
+        """Versión para sobres con varios destinatarios (CCO): sin saludo ni direcciones a la vista."""
+        return self.renderizar("undisclosed-recipients:;")
+
+    def enviar_lote(self, sesion: 'SesionSMTP', destinatarios: List[str]) -> List['bool | Fallo']:
+        """Envía un mismo mensaje a ``destinatarios`` en sobres de varios RCPT; un resultado por destinatario."""
+        try:
+            rechazados = sesion.enviar_lote(self.renderizar_lote(), destinatarios)
+        except Exception as e:
+            METRICAS.contar('correos_fallidos', len(destinatarios))
+            return [clasificar_fallo(e)] * len(destinatarios)
+        METRICAS.contar('correos_enviados', len(destinatarios) - len(rechazados))
+        if rechazados:
+            METRICAS.contar('correos_fallidos', len(rechazados))
+        return [Fallo.de_rcpt(*rechazados[d]) if d in rechazados else True
+                for d in destinatarios]
+
+
+def enviar_correo(destinatario, asunto, mensaje, adjunto=None, sesion: Optional[SesionSMTP] = None):
+    """Envía un correo; con ``sesion`` reutiliza una conexión SMTP ya autenticada."""
+    if not destinatario or not asunto or not mensaje:
+        return False
+
+    try:
+        plantilla = PlantillaCorreo(
+            asunto,
+            mensaje,
+            adjunto_nombre=adjunto.name if adjunto else None,
+            adjunto_datos=adjunto.getvalue() if adjunto else None,
+            saludo=None
+        )
+        if sesion is not None:
+            return bool(plantilla.enviar(sesion, destinatario))
+        with SesionSMTP(timeout=30) as sesion_unica:
+            return bool(plantilla.enviar(sesion_unica, destinatario))
+    except Exception as e:
+        METRICAS.error('enviar_correo', e)
         return False
 
+
+def asunto_convocatoria(conv: Dict) -> str:
+    """Asunto predeterminado para anunciar ``conv``."""
+    return f"🇲🇽 Convocatoria Nacional: {conv['titulo'][:60]}..."
+
+
+def mensaje_convocatoria(conv: Dict) -> str:
+    """Mensaje predeterminado para anunciar ``conv``."""
+    return f"""
+Estimado(a) investigador(a):
+
+La **{conv['entidad']}** ha publicado la siguiente convocatoria nacional:
+
+🎯 **{conv['titulo']}**
+🏛️ **Institución:** {conv['institucion']}
+📌 **Tipo:** {conv['tipo']}
+🔗 **Enlace oficial:** {conv['enlace']}
+📅 **Publicación:** {conv['fecha']}
+⏰ **Cierre:** {conv['plazo']}
+
+📋 **Requisitos generales:**
+• Revisar bases en el enlace oficial
+• Preparar documentación requerida
+• Verificar fechas límite
+
+Atentamente,
+**Sistema de Convocatorias Nacionales**
+INCICh - Instituto Nacional de Cardiología
+"""
+
+
+def repartir_en_sobres(destinatarios: List, por_sobre: int) -> List[List]:
+    """Agrupa ``destinatarios`` en lotes de hasta ``por_sobre`` para el modo CCO."""
+    por_sobre = max(1, int(por_sobre))
+    return [destinatarios[i:i + por_sobre] for i in range(0, len(destinatarios), por_sobre)]
+
+
+def preparar_envios(plantilla: PlantillaCorreo, pendientes: List, por_sobre: Optional[int],
+                    email, nombre, anotar) -> tuple:
+    """``(envios, enviar_uno, al_avanzar)`` para pasar ``pendientes`` a ``despachar_correos``.
+
+    Sin ``por_sobre`` se envía un correo personalizado a cada destinatario;
+    con él, un mismo mensaje por lote CCO de ese tamaño. ``email(d)`` y
+    ``nombre(d)`` leen cada destinatario y ``anotar(d, resultado)`` recibe
+    su resultado definitivo (los de un lote, uno por uno).
+    """
+    if por_sobre:
+        envios = repartir_en_sobres(pendientes, por_sobre)
+
+        def enviar_uno(lote, sesion):
+            return plantilla.enviar_lote(sesion, [email(d) for d in lote])
+
+        def al_avanzar(hechos, total, lote, resultados):
+            for destinatario, resultado in zip(lote, resultados):
+                anotar(destinatario, resultado)
+    else:
+        envios = pendientes
+
+        def enviar_uno(destinatario, sesion):
+            return plantilla.enviar(sesion, email(destinatario), nombre(destinatario))
+
+        def al_avanzar(hechos, total, destinatario, resultado):
+            anotar(destinatario, resultado)
+    return envios, enviar_uno, al_avanzar
+
+
+class TokenBucket:
+    """Limitador de tasa: ``tasa`` mensajes por segundo con ráfagas de hasta ``rafaga``."""
+
+    def __init__(self, tasa, rafaga):
+        self.tasa = float(tasa)
+        self.capacidad = max(1.0, float(rafaga))
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloquea al hilo llamador hasta que haya un token disponible."""
+        if self.tasa <= 0:
+            return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
+
+
+class PoliticaReintentos:
+    """Cuándo reintentar un fallo transitorio y cuánto esperar.
+
+    La espera crece exponencialmente (``base``, 2·base, 4·base... hasta
+    ``tope``) y se sortea entre la mitad y el total de cada tramo, para que
+    los destinatarios que fallaron juntos durante un corte del relay no
+    vuelvan todos a la vez.
+    """
+
+    def __init__(self, intentos: int = 5, base: float = 30.0, tope: float = 900.0):
+        self.intentos = intentos
+        self.base = base
+        self.tope = tope
+
+    def aplica(self, resultado, intento: int) -> bool:
+        return isinstance(resultado, Fallo) and not resultado.permanente and intento < self.intentos
+
+    def espera(self, intento: int) -> float:
+        tramo = min(self.tope, self.base * 2 ** (intento - 1))
+        return tramo / 2 + random.uniform(0, tramo / 2)
+
+
+def despachar_correos(destinatarios, enviar_uno, workers=4, tasa=5.0, rafaga=5, al_avanzar=None,
+                      reintentos: Optional[PoliticaReintentos] = None) -> int:
+    """Envía a ``destinatarios`` con ``workers`` sesiones SMTP concurrentes.
+
+    ``enviar_uno(destinatario, sesion)`` envía un correo y devuelve True o un
+    ``Fallo`` (en modo CCO cada "destinatario" es un lote, una lista, y
+    devuelve una lista de resultados alineada con él).
+    El ritmo lo marca un TokenBucket compartido por todos los workers.
+    Con ``reintentos``, los fallos transitorios se reprograman con espera
+    exponencial sin frenar a nadie: mientras esperan, los workers siguen con
+    el resto (de un lote sólo se reintentan los destinatarios que fallaron).
+    ``al_avanzar(hechos, total, destinatario, resultado)`` recibe sólo
+    resultados definitivos y se llama desde el hilo que invoca esta función
+    (el de Streamlit), así que puede tocar la UI; ``hechos`` y ``total``
+    cuentan destinatarios. Devuelve el número de envíos exitosos.
+
+    Un fallo de campaña (``Fallo.de_campana``) detiene el despacho: se
+    cancela lo que no ha empezado, se descartan los reintentos y, cuando
+    terminan los envíos en curso, se lanza ``CampanaDetenida``. Esos
+    destinatarios no pasan por ``al_avanzar``, así que siguen pendientes.
+    """
+    total = sum(len(d) if isinstance(d, list) else 1 for d in destinatarios)
+    if not total:
+        return 0
+
+    limitador = TokenBucket(tasa, rafaga)
+    locales = threading.local()
+    sesiones = []
+    sesiones_lock = threading.Lock()
+
+    def sesion_del_hilo():
+        sesion = getattr(locales, 'sesion', None)
+        if sesion is None:
+            sesion = locales.sesion = SesionSMTP()
+            with sesiones_lock:
+                sesiones.append(sesion)
+        return sesion
+
+    def enviar(destinatario):
+        limitador.adquirir()
+        return enviar_uno(destinatario, sesion_del_hilo())
+
+    en_espera = []  # (vence, orden, destinatario, intento), el próximo reintento arriba
+    orden = itertools.count()
+    exitosos = hechos = 0
+    detenida = None
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as executor:
+            futuros = {executor.submit(enviar, d): (d, 1) for d in destinatarios}
+            while futuros or en_espera:
+                espera = max(0.0, en_espera[0][0] - time.monotonic()) if en_espera else None
+                if futuros:
+                    listos, _ = wait(futuros, timeout=espera, return_when=FIRST_COMPLETED)
+                else:
+                    # Todo lo pendiente espera un reintento: wait() sobre un conjunto vacío
+                    # regresa de inmediato, así que se duerme hasta que venza el primero
+                    listos = ()
+                    time.sleep(espera)
+                for futuro in listos:
+                    destinatario, intento = futuros.pop(futuro)
+                    es_lote = isinstance(destinatario, list)
+                    try:
+                        resultados = futuro.result()
+                    except Exception as e:
+                        METRICAS.error('despacho', e)
+                        resultados = clasificar_fallo(e)
+                    miembros = destinatario if es_lote else [destinatario]
+                    if not (es_lote and isinstance(resultados, list)):
+                        resultados = [resultados] * len(miembros)
+
+                    reintentar, definitivos = [], []
+                    for miembro, resultado in zip(miembros, resultados):
+                        if isinstance(resultado, Fallo) and resultado.de_campana:
+                            if detenida is None:
+                                detenida = resultado
+                                METRICAS.error('campana', f"smtp_{resultado.codigo or 'sin_codigo'}")
+                                futuros = {f: pendiente for f, pendiente in futuros.items() if not f.cancel()}
+                                en_espera.clear()
+                        elif reintentos is not None and reintentos.aplica(resultado, intento):
+                            # Con la campaña detenida no se reintenta: queda pendiente
+                            reintentar.append(miembro)
+                        else:
+                            definitivos.append((miembro, resultado))
+                    if reintentar and detenida is None:
+                        METRICAS.contar('reintentos_programados', len(reintentar))
+                        heapq.heappush(en_espera, (
+                            time.monotonic() + reintentos.espera(intento), next(orden),
+                            reintentar if es_lote else reintentar[0], intento + 1
+                        ))
+                    if definitivos:
+                        hechos += len(definitivos)
+                        exitosos += sum(bool(resultado) for _, resultado in definitivos)
+                        if al_avanzar and es_lote:
+                            al_avanzar(hechos, total, [m for m, _ in definitivos], [r for _, r in definitivos])
+                        elif al_avanzar:
+                            al_avanzar(hechos, total, destinatario, definitivos[0][1])
+
+                ahora = time.monotonic()
+                while en_espera and en_espera[0][0] <= ahora:
+                    _, _, destinatario, intento = heapq.heappop(en_espera)
+                    futuros[executor.submit(enviar, destinatario)] = (destinatario, intento)
+    finally:
+        for sesion in sesiones:
+            sesion.cerrar()
+
+    if detenida is not None:
+        raise CampanaDetenida(detenida)
+    return exitosos
+
+# ==================== COLA PERSISTENTE DE ENVÍOS ====================
+def conectar_sqlite(ruta: Path) -> sqlite3.Connection:
+    """Conexión SQLite compartible entre hilos (el llamador serializa su uso)."""
+    ruta.parent.mkdir(exist_ok=True)
+    conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ColaEnvios:
+    """Cola de campañas en SQLite: cada destinatario se confirma al enviarse.
+
+    Si el proceso muere a mitad de una campaña, al reiniciar sólo quedan
+    por enviar los destinatarios que siguen en estado 'pendiente'.
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS campanas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            convocatoria_id TEXT NOT NULL,
+            titulo TEXT NOT NULL,
+            asunto TEXT NOT NULL,
+            mensaje TEXT NOT NULL,
+            workers INTEGER NOT NULL,
+            tasa REAL NOT NULL,
+            rafaga INTEGER NOT NULL,
+            adjunto_nombre TEXT,
+            adjunto BLOB,
+            por_sobre INTEGER,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            motivo TEXT,
+            total INTEGER NOT NULL,
+            exitosos INTEGER NOT NULL DEFAULT 0,
+            creada TEXT NOT NULL,
+            terminada TEXT
+        );
+        CREATE TABLE IF NOT EXISTS destinatarios_campana (
+            campana_id INTEGER NOT NULL REFERENCES campanas(id),
+            posicion INTEGER NOT NULL,
+            nombre TEXT NOT NULL,
+            email TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            actualizado TEXT,
+            detalle TEXT,
+            PRIMARY KEY (campana_id, posicion)
+        );
+        CREATE INDEX IF NOT EXISTS idx_destinatarios_estado
+            ON destinatarios_campana (campana_id, estado);
+        CREATE INDEX IF NOT EXISTS idx_campanas_estado ON campanas (estado);
+    """
+
+    # Columnas que no existían en colas creadas por versiones anteriores
+    COLUMNAS_AGREGADAS = {
+        'campanas': (('adjunto_nombre', 'TEXT'), ('adjunto', 'BLOB'), ('por_sobre', 'INTEGER'), ('motivo', 'TEXT')),
+        'destinatarios_campana': (('detalle', 'TEXT'),),
+    }
+
+    def __init__(self, ruta: Path = Path("data") / "cola_envios.db"):
+        self._conn = conectar_sqlite(ruta)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.ESQUEMA)
+            for tabla, nuevas in self.COLUMNAS_AGREGADAS.items():
+                columnas = {fila['name'] for fila in self._conn.execute(f"PRAGMA table_info({tabla})")}
+                for columna, tipo in nuevas:
+                    if columna not in columnas:
+                        self._conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+
+    def encolar(self, convocatoria: Dict, asunto: str, mensaje: str, destinatarios: pd.DataFrame,
+                workers: int, tasa: float, rafaga: int, adjunto_nombre: Optional[str] = None,
+                adjunto: Optional[bytes] = None, por_sobre: Optional[int] = None) -> int:
+        """Guarda una campaña; con ``por_sobre`` se envía en modo CCO, hasta ese número de destinatarios por sobre."""
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """INSERT INTO campanas (convocatoria_id, titulo, asunto, mensaje, workers, tasa,
+                                         rafaga, adjunto_nombre, adjunto, por_sobre, total, creada)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (convocatoria['id'], convocatoria['titulo'], asunto, mensaje, int(workers),
+                 float(tasa), int(rafaga), adjunto_nombre, adjunto, int(por_sobre) if por_sobre else None,
+                 len(destinatarios), ahora)
+            )
+            campana_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO destinatarios_campana (campana_id, posicion, nombre, email) VALUES (?, ?, ?, ?)",
+                ((campana_id, i, nombre, email)
+                 for i, (nombre, email) in enumerate(zip(destinatarios['nombre'], destinatarios['email'])))
+            )
+        return campana_id
+
+    def siguiente(self) -> Optional[sqlite3.Row]:
+        """La campaña a procesar: primero las interrumpidas, luego la más antigua."""
+        with self._lock:
+            return self._conn.execute(
+                """SELECT * FROM campanas WHERE estado IN ('en_curso', 'pendiente')
+                   ORDER BY estado = 'en_curso' DESC, id LIMIT 1"""
+            ).fetchone()
+
+    def obtener(self, campana_id: int) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM campanas WHERE id = ?", (campana_id,)).fetchone()
+
+    def iniciar(self, campana_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE campanas SET estado = 'en_curso' WHERE id = ?", (campana_id,))
+
+    def pendientes(self, campana_id: int) -> List[Dict]:
+        with self._lock:
+            filas = self._conn.execute(
+                """SELECT posicion, nombre, email FROM destinatarios_campana
+                   WHERE campana_id = ? AND estado = 'pendiente' ORDER BY posicion""",
+                (campana_id,)
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def confirmar(self, campana_id: int, posicion: int, ok: bool, detalle: Optional[str] = None):
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.execute(
+                """UPDATE destinatarios_campana SET estado = ?, actualizado = ?, detalle = ?
+                   WHERE campana_id = ? AND posicion = ?""",
+                ('enviado' if ok else 'fallido', ahora, detalle, campana_id, posicion)
+            )
+            if ok:
+                self._conn.execute(
+                    "UPDATE campanas SET exitosos = exitosos + 1 WHERE id = ?", (campana_id,)
+                )
+
+    def omitir(self, campana_id: int, posicion: int, motivo: Optional[str] = None):
+        """Marca a un destinatario que ya había recibido esta convocatoria (o cuya dirección rebota)."""
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.execute(
+                """UPDATE destinatarios_campana SET estado = 'omitido', actualizado = ?, detalle = ?
+                   WHERE campana_id = ? AND posicion = ?""",
+                (ahora, motivo, campana_id, posicion)
+            )
+
+    def terminar(self, campana_id: int):
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE campanas SET estado = 'terminada', terminada = ? WHERE id = ?",
+                (ahora, campana_id)
+            )
+
+    def detener(self, campana_id: int, motivo: str):
+        """Deja la campaña fuera de la cola (con sus pendientes intactos) hasta que se reanude."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE campanas SET estado = 'detenida', motivo = ? WHERE id = ?", (motivo, campana_id)
+            )
+
+    def reanudar(self, campana_id: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE campanas SET estado = 'pendiente', motivo = NULL WHERE id = ? AND estado = 'detenida'",
+                (campana_id,)
+            )
+
+    def recientes(self, limite: int = 10) -> List[Dict]:
+        with self._lock:
+            filas = self._conn.execute(
+                """SELECT c.id, c.titulo, c.estado, c.motivo, c.total, c.exitosos, c.creada, c.terminada,
+                          (SELECT COUNT(*) FROM destinatarios_campana d
+                           WHERE d.campana_id = c.id AND d.estado != 'pendiente') AS procesados
+                   FROM campanas c ORDER BY c.id DESC LIMIT ?""",
+                (limite,)
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+
+class TrabajadorEnvios(threading.Thread):
+    """Hilo de fondo que envía las campañas encoladas, una a la vez.
+
+    Una campaña que falla ``MAX_FALLOS`` veces seguidas (un adjunto ilegible,
+    un error de la base) se detiene con el error como motivo, para que no
+    bloquee a las que esperan detrás; se puede reanudar desde la interfaz.
+    """
+
+    MAX_FALLOS = 3
+
+    def __init__(self, cola: ColaEnvios, espera: float = 5.0):
+        super().__init__(name="trabajador-envios", daemon=True)
+        self.cola = cola
+        self.espera = espera
+        self._despertar = threading.Event()
+        self._fallos: Counter = Counter()
+
+    def despertar(self):
+        self._despertar.set()
+
+    def run(self):
+        while True:
+            campana = self.cola.siguiente()
+            if campana is None:
+                self._despertar.wait(self.espera)
+                self._despertar.clear()
+                continue
+            campana_id = campana['id']
+            try:
+                self.procesar(campana)
+            except Exception as e:
+                METRICAS.error('campana', e)
+                self._fallos[campana_id] += 1
+                registro.exception("Campaña #%d falló (%d de %d intentos)",
+                                   campana_id, self._fallos[campana_id], self.MAX_FALLOS)
+                if self._fallos[campana_id] >= self.MAX_FALLOS:
+                    del self._fallos[campana_id]
+                    try:
+                        self.cola.detener(campana_id, f"{type(e).__name__}: {e}")
+                        continue
+                    except Exception:
+                        registro.exception("No se pudo detener la campaña #%d", campana_id)
+                # Se reintentará desde el último destinatario confirmado
+                time.sleep(self.espera)
+            else:
+                self._fallos.pop(campana_id, None)
+
+    def procesar(self, campana: sqlite3.Row):
+        campana_id = campana['id']
+        self.cola.iniciar(campana_id)
+        plantilla = PlantillaCorreo(
+            campana['asunto'],
+            campana['mensaje'],
+            adjunto_nombre=campana['adjunto_nombre'],
+            adjunto_datos=campana['adjunto']
+        )
+
+        convocatoria_id = campana['convocatoria_id']
+        libro = obtener_libro_entregas()
+        rebotes = obtener_lista_rebotes().emails()
+        pendientes = []
+        for destinatario in self.cola.pendientes(campana_id):
+            if libro.ya_entregado(convocatoria_id, destinatario['email']):
+                self.cola.omitir(campana_id, destinatario['posicion'])
+            elif normalizar_email(destinatario['email']) in rebotes:
+                self.cola.omitir(campana_id, destinatario['posicion'], "en la lista de rebotes")
+            else:
+                pendientes.append(destinatario)
+
+        def confirmar(destinatario, resultado):
+            anotar_resultado(convocatoria_id, destinatario['email'], resultado)
+            self.cola.confirmar(campana_id, destinatario['posicion'], bool(resultado),
+                                None if resultado else str(resultado))
+
+        envios, enviar_uno, al_avanzar = preparar_envios(
+            plantilla, pendientes, campana['por_sobre'],
+            email=lambda d: d['email'], nombre=lambda d: d['nombre'], anotar=confirmar
+        )
+        try:
+            despachar_correos(
+                envios,
+                enviar_uno,
+                workers=campana['workers'],
+                tasa=campana['tasa'],
+                rafaga=campana['rafaga'],
+                al_avanzar=al_avanzar,
+                reintentos=PoliticaReintentos()
+            )
+        except CampanaDetenida as e:
+            registro.error("Campaña #%d detenida: %s", campana_id, e)
+            self.cola.detener(campana_id, str(e))
+            return
+        self.cola.terminar(campana_id)
+
+        exitosos = self.cola.obtener(campana_id)['exitosos']
+        if exitosos > 0:
+            registrar_envio_log(campana['convocatoria_id'], campana['titulo'], campana['total'], exitosos)
+
+
+@recurso_compartido()
+def obtener_cola_envios() -> ColaEnvios:
+    return ColaEnvios()
+
+
+@recurso_compartido()
+def obtener_trabajador_envios() -> TrabajadorEnvios:
+    """Arranca (una vez por proceso) el hilo que atiende la cola de envíos."""
+    trabajador = TrabajadorEnvios(obtener_cola_envios())
+    trabajador.start()
+    return trabajador
+
+# ==================== MOTOR DE SCRAPING ====================
+class CacheHTTP:
+    """Cache en disco de páginas descargadas, con sus validadores HTTP.
+
+    Guarda el cuerpo junto al ETag y Last-Modified de la respuesta para
+    revalidar con una petición condicional: una página sin cambios cuesta
+    un 304 sin cuerpo.
+    """
+
+    def __init__(self, directorio: Path = Path("data") / "http_cache"):
+        self.directorio = directorio
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    def _rutas(self, url: str):
+        clave = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.directorio / f"{clave}.json", self.directorio / f"{clave}.html"
+
+    def obtener(self, url: str) -> Optional[Dict]:
+        ruta_meta, ruta_cuerpo = self._rutas(url)
+        try:
+            with open(ruta_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['cuerpo'] = ruta_cuerpo.read_bytes()
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                encoding: Optional[str], cuerpo: bytes):
+        ruta_meta, ruta_cuerpo = self._rutas(url)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'encoding': encoding}
+        # Escritura atómica: primero el cuerpo, luego los metadatos que lo validan
+        for ruta, datos in ((ruta_cuerpo, cuerpo), (ruta_meta, json.dumps(meta).encode('utf-8'))):
+            temporal = ruta.with_suffix(ruta.suffix + '.tmp')
+            temporal.write_bytes(datos)
+            os.replace(temporal, ruta)
+
+
+class MotorScraping:
+    """Descarga páginas con una ``requests.Session`` compartida (pool de conexiones)."""
+
+    def __init__(self, headers: Optional[Dict] = None, timeout=(5, 15), cache: Optional[CacheHTTP] = None,
+                 max_conexiones: int = 10):
+        self.timeout = timeout
+        self.cache = cache or CacheHTTP()
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        reintentos = urllib3.util.retry.Retry(total=1, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adaptador = requests.adapters.HTTPAdapter(pool_connections=max_conexiones, pool_maxsize=max_conexiones, max_retries=reintentos)
+        self.session.mount("http://", adaptador)
+        self.session.mount("https://", adaptador)
+
+    @staticmethod
+    def _decodificar(cuerpo: bytes, encoding: Optional[str]) -> str:
+        return cuerpo.decode(encoding or 'utf-8', errors='replace')
+
+    def descargar(self, url: str) -> Optional[str]:
+        """Devuelve el HTML de ``url``, revalidando la copia en cache si la hay.
+
+        Si la red falla y existe una copia previa, se usa esa copia.
+        """
+        entrada = self.cache.obtener(url)
+        condicionales = {}
+        if entrada:
+            if entrada.get('etag'):
+                condicionales['If-None-Match'] = entrada['etag']
+            if entrada.get('last_modified'):
+                condicionales['If-Modified-Since'] = entrada['last_modified']
+
+        try:
+            with METRICAS.medir('http_descarga'):
+                respuesta = self.session.get(url, headers=condicionales, timeout=self.timeout)
+        except requests.RequestException:
+            return self._decodificar(entrada['cuerpo'], entrada.get('encoding')) if entrada else None
+
+        METRICAS.contar(f'http_{respuesta.status_code}')
+        if respuesta.status_code == 304 and entrada:
+            return self._decodificar(entrada['cuerpo'], entrada.get('encoding'))
+        if respuesta.status_code != 200:
+            return self._decodificar(entrada['cuerpo'], entrada.get('encoding')) if entrada else None
+
+        encoding = respuesta.encoding
+        if not encoding or encoding.lower() == 'iso-8859-1':
+            # requests asume latin-1 si el servidor no declara charset
+            encoding = respuesta.apparent_encoding
+        self.cache.guardar(
+            url,
+            respuesta.headers.get('ETag'),
+            respuesta.headers.get('Last-Modified'),
+            encoding,
+            respuesta.content
+        )
+        return self._decodificar(respuesta.content, encoding)
+
+    def sopa(self, url: str) -> Optional[bs4.BeautifulSoup]:
+        html = self.descargar(url)
+        return bs4.BeautifulSoup(html, 'html.parser') if html else None
+
+
+@recurso_compartido()
+def obtener_motor_scraping(user_agent: str) -> MotorScraping:
+    return MotorScraping(headers={"User-Agent": user_agent})
+
+
+# ==================== ALMACÉN DE CONVOCATORIAS ====================
+def clave_convocatoria(convocatoria: Dict) -> str:
+    """Hash estable del contenido que identifica a una convocatoria entre búsquedas."""
+    partes = (convocatoria.get('institucion', ''), convocatoria.get('titulo', ''), convocatoria.get('enlace', ''))
+    normalizado = '\x1f'.join(' '.join(p.split()).lower() for p in partes)
+    return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()[:20]
+
+
+class AlmacenConvocatorias:
+    """Convocatorias en SQLite, deduplicadas por ``clave_convocatoria``.
+
+    Cada búsqueda hace upsert: las ya conocidas sólo actualizan sus datos y
+    ``ultima_vez``; ``primera_vez`` conserva la fecha en que aparecieron.
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS convocatorias (
+            clave TEXT PRIMARY KEY,
+            id TEXT NOT NULL,
+            institucion TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            area TEXT,
+            titulo TEXT NOT NULL,
+            datos TEXT NOT NULL,
+            primera_vez TEXT NOT NULL,
+            ultima_vez TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_convocatorias_institucion ON convocatorias (institucion, ultima_vez);
+        CREATE INDEX IF NOT EXISTS idx_convocatorias_tipo ON convocatorias (tipo, ultima_vez);
+        CREATE INDEX IF NOT EXISTS idx_convocatorias_ultima_vez ON convocatorias (ultima_vez);
+        CREATE INDEX IF NOT EXISTS idx_convocatorias_primera_vez ON convocatorias (primera_vez);
+    """
+
+    def __init__(self, ruta: Path = Path("data") / "convocatorias.db",
+                 json_anterior: Path = Path("data") / "convocatorias_nacionales.json"):
+        self._conn = conectar_sqlite(ruta)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.ESQUEMA)
+        self._importar_json(json_anterior)
+
+    def _importar_json(self, ruta: Path):
+        """Importa una sola vez el archivo JSON que usaban versiones anteriores."""
+        with self._lock:
+            vacio = self._conn.execute("SELECT 1 FROM convocatorias LIMIT 1").fetchone() is None
+        if not vacio or not ruta.exists():
+            return
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                anteriores = json.load(f)
+        except (OSError, ValueError):
+            return
+        for convocatoria in anteriores:
+            convocatoria['id'] = re.sub(r'-\d{8}$', '', convocatoria.get('id', ''))
+        self.guardar(anteriores, fecha=datetime.fromtimestamp(ruta.stat().st_mtime).strftime("%Y-%m-%d"))
+
+    def guardar(self, convocatorias: List[Dict], fecha: Optional[str] = None) -> int:
+        """Upsert de ``convocatorias``; devuelve cuántas eran nuevas."""
+        fecha = fecha or datetime.now().strftime("%Y-%m-%d")
+        filas = []
+        for convocatoria in convocatorias:
+            clave = convocatoria.setdefault('clave', clave_convocatoria(convocatoria))
+            filas.append((
+                clave, convocatoria['id'], convocatoria['institucion'], convocatoria['tipo'],
+                convocatoria.get('area'), convocatoria['titulo'],
+                json.dumps(convocatoria, ensure_ascii=False), fecha, fecha
+            ))
+        with self._lock, self._conn:
+            antes = self._conn.execute("SELECT COUNT(*) FROM convocatorias").fetchone()[0]
+            self._conn.executemany(
+                """INSERT INTO convocatorias (clave, id, institucion, tipo, area, titulo, datos,
+                                              primera_vez, ultima_vez)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (clave) DO UPDATE SET
+                       id = excluded.id,
+                       tipo = excluded.tipo,
+                       area = excluded.area,
+                       datos = excluded.datos,
+                       ultima_vez = MAX(ultima_vez, excluded.ultima_vez)""",
+                filas
+            )
+            despues = self._conn.execute("SELECT COUNT(*) FROM convocatorias").fetchone()[0]
+        return despues - antes
+
+    def ultima_fecha(self) -> Optional[str]:
+        with self._lock:
+            return self._conn.execute("SELECT MAX(ultima_vez) FROM convocatorias").fetchone()[0]
+
+    def consultar(self, institucion: Optional[str] = None, tipo: Optional[str] = None,
+                  desde: Optional[str] = None, hasta: Optional[str] = None,
+                  nuevas_desde: Optional[str] = None, limite: Optional[int] = None,
+                  offset: int = 0) -> List[Dict]:
+        """Convocatorias filtradas por índice.
+
+        ``desde``/``hasta`` (YYYY-MM-DD) acotan la fecha en que se vieron por
+        última vez; ``nuevas_desde`` la fecha en que aparecieron.
+        """
+        condiciones, parametros = [], []
+        for columna, operador, valor in (
+            ('institucion', '=', institucion),
+            ('tipo', '=', tipo),
+            ('ultima_vez', '>=', desde),
+            ('ultima_vez', '<=', hasta),
+            ('primera_vez', '>=', nuevas_desde),
+        ):
+            if valor is not None:
+                condiciones.append(f"{columna} {operador} ?")
+                parametros.append(valor)
+        sql = "SELECT datos, primera_vez, ultima_vez FROM convocatorias"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY institucion, id"
+        if limite is not None:
+            sql += " LIMIT ? OFFSET ?"
+            parametros.extend([limite, offset])
+
+        with self._lock:
+            filas = self._conn.execute(sql, parametros).fetchall()
+        convocatorias = []
+        for fila in filas:
+            convocatoria = json.loads(fila['datos'])
+            convocatoria['primera_vez'] = fila['primera_vez']
+            convocatoria['ultima_vez'] = fila['ultima_vez']
+            convocatorias.append(convocatoria)
+        return convocatorias
+
+
+@recurso_compartido()
+def obtener_almacen_convocatorias() -> AlmacenConvocatorias:
+    return AlmacenConvocatorias()
+
+
 # ==================== BUSCADOR DE CONVOCATORIAS NACIONALES ====================
 class BuscadorConvocatoriasNacionales:
-    def __init__(self):
+    # Textos de enlace que suelen corresponder a una convocatoria concreta
+    PATRON_CONVOCATORIA = re.compile(
+        r'convocatoria|beca|programa|fondo|apoyo|c[aá]tedra|premio|estancia|proyecto', re.IGNORECASE
+    )
+    PATRON_FECHA = re.compile(
+        r'\b\d{1,2}\s+de\s+[a-záéíóú]+(?:\s+de)?\s+\d{4}\b|\b\d{1,2}/\d{1,2}/\d{4}\b', re.IGNORECASE
+    )
+    MAX_POR_PAGINA = 30
+    
+    def __init__(self, motor: Optional[MotorScraping] = None, reescribir_url=None, scraping: bool = True):
+        """
+        ``motor`` permite inyectar otro MotorScraping y ``reescribir_url``
+        (url -> url) redirige las páginas de listado, p. ej. a un servidor
+        HTTP local con páginas guardadas. Con ``scraping=False`` sólo se
+        devuelven las entradas fijas de cada fuente.
+        """
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         self.headers = {"User-Agent": self.user_agent}
         self.timeout = 15
+        self.timeout_fuente = 30
+        self.timeouts_fuente: Dict[str, float] = {}
         self.fecha_actual = datetime.now().strftime("%Y-%m-%d")
+        self.scraping = scraping
+        self.reescribir_url = reescribir_url
+        self._motor = motor
+    
+    @property
+    def motor(self) -> MotorScraping:
+        if self._motor is None:
+            self._motor = obtener_motor_scraping(self.user_agent)
+        return self._motor
+    
+    def extraer_listado(self, pagina: Dict) -> List[Dict]:
+        """Convocatorias enlazadas desde la página de listado ``pagina['enlace']``.
+        
+        Cada enlace hereda entidad, área, tipo e institución de la página y
+        se resuelve contra la URL original aunque se haya usado ``reescribir_url``.
+        """
+        url = pagina['enlace']
+        sopa = self.motor.sopa(self.reescribir_url(url) if self.reescribir_url else url)
+        if sopa is None:
+            return []
+        
+        convocatorias = []
+        vistos = set()
+        for enlace in sopa.find_all('a', href=True):
+            titulo = ' '.join(enlace.get_text(' ', strip=True).split())
+            if len(titulo) < 15 or not self.PATRON_CONVOCATORIA.search(titulo):
+                continue
+            href = urljoin(url, enlace['href'])
+            if href in vistos or href.rstrip('/') == url.rstrip('/') or not href.startswith('http'):
+                continue
+            vistos.add(href)
+            
+            contexto = enlace.find_parent(['li', 'article', 'tr', 'div', 'p'])
+            fecha_plazo = self.PATRON_FECHA.search(contexto.get_text(' ', strip=True)) if contexto else None
+            
+            convocatoria = dict(pagina)
+            convocatoria.update({
+                'id': f'{pagina["id"]}-{hashlib.sha1(href.encode()).hexdigest()[:8]}',
+                'titulo': titulo[:300],
+                'enlace': href,
+                'plazo': fecha_plazo.group(0) if fecha_plazo else pagina['plazo'],
+            })
+            convocatorias.append(convocatoria)
+            if len(convocatorias) >= self.MAX_POR_PAGINA:
+                break
+        return convocatorias
+    
+    def extraer_listados(self, paginas: List[Dict]) -> List[Dict]:
+        """Expande cada página de listado; si no se puede, conserva la entrada fija."""
+        if not self.scraping:
+            return paginas
+        
+        def extraer(pagina):
+            try:
+                return self.extraer_listado(pagina)
+            except Exception as e:
+                METRICAS.error('extraer_listado', e)
+                return []
+        
+        with ThreadPoolExecutor(max_workers=len(paginas), thread_name_prefix="listado") as executor:
+            extraidas = list(executor.map(extraer, paginas))
+        convocatorias = []
+        for pagina, encontradas in zip(paginas, extraidas):
+            convocatorias.extend(encontradas or [pagina])
+        return convocatorias
     
     def buscar_secihti(self) -> List[Dict]:
         """Busca convocatorias en SECIHTI (antes CONACYT) - Principal fuente nacional"""
@@ -208,7 +1985,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 1: Ciencia y Humanidades
         convocatorias.append({
-            'id': f'SECIHTI-CYH-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'SECIHTI-CYH',
             'titulo': 'Convocatorias Ciencia y Humanidades 2026',
             'entidad': 'SECIHTI - Secretaría de Ciencia, Humanidades, Tecnología e Innovación',
             'enlace': 'https://secihti.mx/convocatoria_categoria/ciencias-y-humanidades/',
@@ -222,7 +1999,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 2: Becas Nacionales
         convocatorias.append({
-            'id': f'SECIHTI-BECAS-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'SECIHTI-BECAS',
             'titulo': 'Becas Nacionales para Estudios de Posgrado 2026',
             'entidad': 'SECIHTI - Becas Nacionales',
             'enlace': 'https://secihti.mx/becas-nacionales/',
@@ -236,7 +2013,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 3: Cátedras
         convocatorias.append({
-            'id': f'SECIHTI-CATEDRAS-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'SECIHTI-CATEDRAS',
             'titulo': 'Cátedras CONAHCYT para Jóvenes Investigadores 2026',
             'entidad': 'SECIHTI - Cátedras',
             'enlace': 'https://secihti.mx/catedras/',
@@ -248,7 +2025,7 @@ class BuscadorConvocatoriasNacionales:
             'tipo': 'Cátedra'
         })
         
-        return convocatorias
+        return self.extraer_listados(convocatorias)
     
     def buscar_unam(self) -> List[Dict]:
         """Busca convocatorias en UNAM"""
@@ -256,7 +2033,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 4: DGAPA - PAPIIT
         convocatorias.append({
-            'id': f'UNAM-PAPIIT-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'UNAM-PAPIIT',
             'titulo': 'Programa de Apoyo a Proyectos de Investigación e Innovación Tecnológica (PAPIIT) 2026',
             'entidad': 'UNAM - DGAPA',
             'enlace': 'https://dgapa.unam.mx/index.php/aypapiit',
@@ -270,7 +2047,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 5: PAPIME
         convocatorias.append({
-            'id': f'UNAM-PAPIME-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'UNAM-PAPIME',
             'titulo': 'Programa de Apoyo a Proyectos para la Innovación y Mejoramiento de la Enseñanza (PAPIME) 2026',
             'entidad': 'UNAM - DGAPA',
             'enlace': 'https://dgapa.unam.mx/index.php/aypapime',
@@ -284,7 +2061,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 6: PASPA
         convocatorias.append({
-            'id': f'UNAM-PASPA-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'UNAM-PASPA',
             'titulo': 'Programa de Apoyos para la Superación del Personal Académico (PASPA) 2026',
             'entidad': 'UNAM - DGAPA',
             'enlace': 'https://dgapa.unam.mx/index.php/aypaspa',
@@ -296,7 +2073,7 @@ class BuscadorConvocatoriasNacionales:
             'tipo': 'Beca'
         })
         
-        return convocatorias
+        return self.extraer_listados(convocatorias)
     
     def buscar_ipn(self) -> List[Dict]:
         """Busca convocatorias en IPN"""
@@ -304,7 +2081,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 7: SIP - Investigación
         convocatorias.append({
-            'id': f'IPN-SIP-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'IPN-SIP',
             'titulo': 'Convocatoria de Investigación Científica y Desarrollo Tecnológico 2026',
             'entidad': 'IPN - Secretaría de Investigación y Posgrado',
             'enlace': 'https://www.ipn.mx/investigacion/convocatorias/',
@@ -318,7 +2095,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 8: COFAA - Becas
         convocatorias.append({
-            'id': f'IPN-COFAA-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'IPN-COFAA',
             'titulo': 'Becas COFAA para Estudios de Posgrado 2026',
             'entidad': 'IPN - COFAA',
             'enlace': 'https://www.cofaa.ipn.mx/',
@@ -330,7 +2107,7 @@ class BuscadorConvocatoriasNacionales:
             'tipo': 'Beca'
         })
         
-        return convocatorias
+        return self.extraer_listados(convocatorias)
     
     def buscar_salud(self) -> List[Dict]:
         """Busca convocatorias en Sector Salud"""
@@ -338,7 +2115,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 9: IMSS - Investigación
         convocatorias.append({
-            'id': f'IMSS-INV-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'IMSS-INV',
             'titulo': 'Convocatoria de Investigación en Salud 2026',
             'entidad': 'IMSS - Coordinación de Investigación en Salud',
             'enlace': 'http://www.imss.gob.mx/investigacion',
@@ -352,7 +2129,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 10: INC - Cardiología
         convocatorias.append({
-            'id': f'INC-INV-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'INC-INV',
             'titulo': 'Convocatoria de Investigación en Cardiología 2026',
             'entidad': 'Instituto Nacional de Cardiología - INCICh',
             'enlace': 'https://www.gob.mx/salud/acciones-y-programas/convocatorias',
@@ -364,7 +2141,7 @@ class BuscadorConvocatoriasNacionales:
             'tipo': 'Investigación'
         })
         
-        return convocatorias
+        return self.extraer_listados(convocatorias)
     
     def buscar_energia(self) -> List[Dict]:
         """Busca convocatorias en Sector Energía"""
@@ -372,7 +2149,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 11: SENER - Energía
         convocatorias.append({
-            'id': f'SENER-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'SENER',
             'titulo': 'Fondo Sectorial CONACYT-SENER-Hidrocarburos 2026',
             'entidad': 'SENER - Secretaría de Energía',
             'enlace': 'https://www.gob.mx/sener',
@@ -384,7 +2161,7 @@ class BuscadorConvocatoriasNacionales:
             'tipo': 'Fondo Sectorial'
         })
         
-        return convocatorias
+        return self.extraer_listados(convocatorias)
     
     def buscar_agricultura(self) -> List[Dict]:
         """Busca convocatorias en Sector Agropecuario"""
@@ -392,7 +2169,7 @@ class BuscadorConvocatoriasNacionales:
         
         # Fuente 12: INIFAP
         convocatorias.append({
-            'id': f'INIFAP-{datetime.now().strftime("%Y%m%d")}',
+            'id': 'INIFAP',
             'titulo': 'Convocatoria de Investigación Agropecuaria 2026',
             'entidad': 'INIFAP - Instituto Nacional de Investigaciones Forestales',
             'enlace': 'https://www.gob.mx/inifap',
@@ -404,17 +2181,11 @@ class BuscadorConvocatoriasNacionales:
             'tipo': 'Investigación'
         })
         
-        return convocatorias
+        return self.extraer_listados(convocatorias)
     
-    def buscar_todas(self) -> List[Dict]:
-        """Busca TODAS las convocatorias nacionales"""
-        todas_convocatorias = []
-        
-        # Progreso
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        fuentes = [
+    def fuentes(self) -> List[tuple]:
+        """(nombre, función de búsqueda) de cada fuente nacional."""
+        return [
             ("SECIHTI", self.buscar_secihti),
             ("UNAM", self.buscar_unam),
             ("IPN", self.buscar_ipn),
@@ -422,54 +2193,472 @@ class BuscadorConvocatoriasNacionales:
             ("ENERGÍA", self.buscar_energia),
             ("AGRICULTURA", self.buscar_agricultura)
         ]
+    
+    @staticmethod
+    def _medir_fuente(nombre, fuente):
+        with METRICAS.medir(f"fuente:{nombre}"):
+            return fuente()
+    
+    def consultar_fuentes(self, nombres: Optional[List[str]] = None, al_avanzar=None) -> Dict[str, List[Dict]]:
+        """Consulta en paralelo las fuentes ``nombres`` (todas por omisión).
         
-        for i, (nombre, fuente) in enumerate(fuentes):
-            status_text.text(f"🔍 Buscando convocatorias en {nombre}...")
-            try:
-                resultados = fuente()
-                todas_convocatorias.extend(resultados)
-                time.sleep(0.5)
-            except Exception as e:
-                st.warning(f"Error en {nombre}: {str(e)[:50]}")
+        Cada fuente tiene su propio límite de tiempo (``timeouts_fuente`` o
+        ``timeout_fuente``) y sus errores no afectan a las demás, así que la
+        latencia total es la de la fuente más lenta. Devuelve los resultados
+        de las fuentes que respondieron; ``al_avanzar(terminadas, total, listas)``
+        se llama en el hilo actual cada vez que termina o vence alguna.
+        """
+        resultados_por_fuente = {}
+        fuentes = [(nombre, fuente) for nombre, fuente in self.fuentes() if nombres is None or nombre in nombres]
+        if not fuentes:
+            return resultados_por_fuente
+        
+        executor = ThreadPoolExecutor(max_workers=len(fuentes), thread_name_prefix="buscador")
+        try:
+            inicio = time.monotonic()
+            futuros = {executor.submit(self._medir_fuente, nombre, fuente): nombre for nombre, fuente in fuentes}
+            limites = {
+                futuro: inicio + self.timeouts_fuente.get(nombre, self.timeout_fuente)
+                for futuro, nombre in futuros.items()
+            }
+            pendientes = set(futuros)
+            terminadas = 0
             
-            progress_bar.progress((i + 1) / len(fuentes))
+            while pendientes:
+                proximo_limite = min(limites[f] for f in pendientes)
+                listos, pendientes = wait(
+                    pendientes,
+                    timeout=max(0.0, proximo_limite - time.monotonic()),
+                    return_when=FIRST_COMPLETED
+                )
+                for futuro in listos:
+                    nombre = futuros[futuro]
+                    try:
+                        resultados_por_fuente[nombre] = futuro.result()
+                    except Exception as e:
+                        avisar(f"Error en {nombre}: {str(e)[:50]}", 'warning')
+                
+                ahora = time.monotonic()
+                vencidos = {f for f in pendientes if limites[f] <= ahora}
+                for futuro in vencidos:
+                    METRICAS.error(f"fuente:{futuros[futuro]}", 'TiempoAgotado')
+                    avisar(f"Tiempo agotado en {futuros[futuro]}", 'warning')
+                pendientes -= vencidos
+                
+                terminadas += len(listos) + len(vencidos)
+                if al_avanzar:
+                    al_avanzar(terminadas, len(fuentes), [futuros[f] for f in listos])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        progress_bar.empty()
-        status_text.empty()
+        return resultados_por_fuente
+    
+    def buscar_todas(self) -> List[Dict]:
+        """Busca TODAS las convocatorias nacionales (ver ``consultar_fuentes``), con progreso en la página."""
+        fuentes = self.fuentes()
+        if MODO_HEADLESS:
+            resultados_por_fuente = self.consultar_fuentes()
+        else:
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            status_text.text(f"🔍 Buscando convocatorias en {len(fuentes)} fuentes...")
+            
+            def al_avanzar(terminadas, total, listas):
+                if listas:
+                    status_text.text(f"✅ {', '.join(listas)} ({terminadas}/{total})")
+                progress_bar.progress(terminadas / total)
+            
+            resultados_por_fuente = self.consultar_fuentes(al_avanzar=al_avanzar)
+            progress_bar.empty()
+            status_text.empty()
         
+        todas_convocatorias = []
+        for nombre, _ in fuentes:
+            todas_convocatorias.extend(resultados_por_fuente.get(nombre, []))
         return todas_convocatorias
     
-    def guardar_convocatorias(self, convocatorias: List[Dict]):
-        DATA_DIR = Path("data")
-        DATA_DIR.mkdir(exist_ok=True)
-        CONVOCATORIAS_FILE = DATA_DIR / "convocatorias_nacionales.json"
-        
+    def guardar_convocatorias(self, convocatorias: List[Dict]) -> int:
+        """Registra la búsqueda en el almacén; devuelve cuántas convocatorias son nuevas."""
+        try:
+            return obtener_almacen_convocatorias().guardar(convocatorias, fecha=self.fecha_actual)
+        except Exception as e:
+            METRICAS.error('almacen_convocatorias', e)
+            return 0
+    
+    def cargar_convocatorias(self) -> List[Dict]:
+        """Convocatorias vistas en la búsqueda más reciente que se guardó."""
+        try:
+            almacen = obtener_almacen_convocatorias()
+            ultima = almacen.ultima_fecha()
+            return almacen.consultar(desde=ultima) if ultima else []
+        except Exception as e:
+            METRICAS.error('almacen_convocatorias', e)
+            return []
+
+# ==================== CACHE COMPARTIDA DE BÚSQUEDAS ====================
+class CacheBusquedas:
+    """Resultados de búsqueda compartidos por todas las sesiones del proceso.
+
+    Una entrada es vigente durante ``ttl`` segundos; una búsqueda forzada
+    sólo se repite si la entrada tiene al menos ``intervalo_minimo`` segundos,
+    y las peticiones idénticas simultáneas esperan a una única ejecución.
+    Guarda como máximo ``max_entradas`` claves (LRU).
+    """
+
+    def __init__(self, ttl=900, intervalo_minimo=60, max_entradas=8):
+        self.ttl = ttl
+        self.intervalo_minimo = intervalo_minimo
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def _guardar(self, clave, instante, resultados):
+        self._entradas[clave] = (instante, resultados)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def actual(self, clave):
+        """Últimos resultados conocidos para ``clave``, sin importar su edad."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            return entrada[1] if entrada else None
+
+    def precalentar(self, clave, cargar):
+        """En frío, siembra ``clave`` con ``cargar()`` (p. ej. desde disco) como dato caducado."""
+        with self._lock:
+            if clave in self._entradas:
+                return self._entradas[clave][1]
+        resultados = cargar()
+        with self._lock:
+            if clave not in self._entradas and resultados:
+                self._guardar(clave, float('-inf'), resultados)
+            entrada = self._entradas.get(clave)
+            return entrada[1] if entrada else None
+
+    def obtener(self, clave, calcular, forzar=False):
+        """Resultados vigentes de ``clave`` o, si no los hay, los de un único ``calcular()``."""
+        while True:
+            with self._lock:
+                entrada = self._entradas.get(clave)
+                if entrada:
+                    edad = time.monotonic() - entrada[0]
+                    if edad < (self.intervalo_minimo if forzar else self.ttl):
+                        self._entradas.move_to_end(clave)
+                        return entrada[1]
+                evento = self._en_curso.get(clave)
+                lider = evento is None
+                if lider:
+                    evento = self._en_curso[clave] = threading.Event()
+            if not lider:
+                # Otra sesión ya está buscando: se reutiliza su resultado
+                evento.wait()
+                forzar = False
+                continue
+            try:
+                resultados = calcular()
+                with self._lock:
+                    self._guardar(clave, time.monotonic(), resultados)
+                return resultados
+            finally:
+                with self._lock:
+                    del self._en_curso[clave]
+                evento.set()
+
+
+@recurso_compartido()
+def obtener_cache_busquedas() -> CacheBusquedas:
+    return CacheBusquedas()
+
+
+CLAVE_BUSQUEDA_NACIONAL = "nacionales"
+
+
+def buscar_convocatorias(forzar: bool = False) -> List[Dict]:
+    """Búsqueda completa compartida entre sesiones (ver CacheBusquedas)."""
+    buscador = BuscadorConvocatoriasNacionales()
+
+    def calcular():
+        convocatorias = buscador.buscar_todas()
+        if convocatorias:
+            buscador.guardar_convocatorias(convocatorias)
+        return convocatorias
+
+    return obtener_cache_busquedas().obtener(CLAVE_BUSQUEDA_NACIONAL, calcular, forzar=forzar)
+
+
+def convocatorias_precargadas() -> Optional[List[Dict]]:
+    """Resultados ya disponibles en el proceso o, en frío, los guardados en disco."""
+    return obtener_cache_busquedas().precalentar(
+        CLAVE_BUSQUEDA_NACIONAL,
+        lambda: BuscadorConvocatoriasNacionales().cargar_convocatorias()
+    )
+
+# ==================== INSTANTÁNEAS COMPARTIDAS ====================
+class Instantanea:
+    """Una versión inmutable del padrón o de las convocatorias, compartida por referencia.
+
+    ``version`` crece con cada publicación y, a diferencia de ``id()``, nunca
+    se reutiliza. Las estructuras derivadas (índices, motor de relevancia)
+    se calculan una vez por versión con ``derivado`` y se liberan con ella
+    (como máximo ``MAX_DERIVADOS``, LRU).
+    """
+
+    MAX_DERIVADOS = 8
+
+    __slots__ = ('nombre', 'version', 'datos', 'publicada', '_derivados', '_lock', '__weakref__')
+
+    def __init__(self, nombre: str, version: int, datos):
+        self.nombre = nombre
+        self.version = version
+        self.datos = datos
+        self.publicada = datetime.now()
+        self._derivados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.datos)
+
+    def derivado(self, clave, calcular):
+        """``calcular()`` una sola vez por versión; las sesiones simultáneas esperan al primero."""
+        with self._lock:
+            if clave in self._derivados:
+                self._derivados.move_to_end(clave)
+                return self._derivados[clave]
+            valor = self._derivados[clave] = calcular()
+            while len(self._derivados) > self.MAX_DERIVADOS:
+                self._derivados.popitem(last=False)
+            return valor
+
+
+class RegistroInstantaneas:
+    """Última instantánea publicada de cada conjunto, la misma para todas las sesiones.
+
+    Publicar sólo cambia una referencia bajo lock: quien ya tenía la versión
+    anterior la sigue leyendo intacta y pasa a la nueva en su siguiente
+    rerun (``adoptar_instantaneas``). Cuando ninguna sesión la referencia,
+    la versión vieja se libera sola; ``vivas`` lo observa con weakrefs.
+    """
+
+    def __init__(self):
+        self._actuales: Dict[str, Instantanea] = {}
+        self._versiones = Counter()
+        self._vivas = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def actual(self, nombre: str) -> Optional[Instantanea]:
+        with self._lock:
+            return self._actuales.get(nombre)
+
+    def publicar(self, nombre: str, datos) -> Instantanea:
+        """Publica ``datos`` como nueva versión; si son los mismos que la vigente, la devuelve."""
+        with self._lock:
+            vigente = self._actuales.get(nombre)
+            if vigente is not None and vigente.datos is datos:
+                return vigente
+            self._versiones[nombre] += 1
+            nueva = self._actuales[nombre] = Instantanea(nombre, self._versiones[nombre], datos)
+            self._vivas.add(nueva)
+        METRICAS.contar(f'instantaneas_{nombre}_publicadas')
+        return nueva
+
+    def vivas(self, nombre: str) -> List[int]:
+        """Versiones de ``nombre`` que alguna sesión (o caché) todavía referencia."""
+        with self._lock:
+            return sorted(i.version for i in list(self._vivas) if i.nombre == nombre)
+
+
+@recurso_compartido()
+def obtener_instantaneas() -> RegistroInstantaneas:
+    return RegistroInstantaneas()
+
+
+def publicar_padron(forzar: bool = False) -> Optional[Instantanea]:
+    """Carga el padrón y lo publica si cambió; None si no se pudo cargar.
+
+    Con el archivo remoto sin cambios, CacheInteresados devuelve el mismo
+    padrón y la versión vigente se conserva.
+    """
+    padron = obtener_interesados_activos(forzar=forzar)
+    if padron.empty:
+        return None
+    return obtener_instantaneas().publicar('padron', padron)
+
+
+def publicar_convocatorias(forzar: bool = False) -> Optional[Instantanea]:
+    """Búsqueda compartida (``buscar_convocatorias``) publicada como instantánea."""
+    convocatorias = buscar_convocatorias(forzar=forzar)
+    if not convocatorias:
+        return None
+    return obtener_instantaneas().publicar('convocatorias', convocatorias)
+
+
+def adoptar_instantaneas():
+    """Pasa la sesión a las últimas versiones publicadas, por ella o por cualquier otra sesión.
+
+    Las sesiones nuevas arrancan con la última búsqueda conocida (en frío,
+    la guardada en disco). Al cambiar de padrón, la selección se traslada
+    por email a las posiciones de la versión nueva.
+    """
+    instantaneas = obtener_instantaneas()
+    convocatorias = instantaneas.actual('convocatorias')
+    if convocatorias is None:
+        precargadas = convocatorias_precargadas()
+        if precargadas:
+            convocatorias = instantaneas.publicar('convocatorias', precargadas)
+    if convocatorias is not None:
+        st.session_state.convocatorias = convocatorias
+
+    padron = instantaneas.actual('padron')
+    anterior = st.session_state.get('interesados')
+    if padron is not None and padron is not anterior:
+        if anterior is not None:
+            fijar_seleccion(trasladar_seleccion(anterior.datos, padron.datos, seleccion_actual()))
+        st.session_state.interesados = padron
+
+# ==================== FUNCIONES DE LOG ====================
+class HistorialEnvios:
+    """Historial de campañas en SQLite con totales que se actualizan al escribir.
+
+    Las métricas de la pestaña de estadísticas se leen de ``totales`` e
+    ``instituciones`` sin recorrer el historial, y la tabla se consulta por
+    páginas usando los índices de fecha e institución.
+    """
+
+    CAMPOS = ['fecha', 'convocatoria_id', 'titulo', 'institucion',
+              'total_destinatarios', 'envios_exitosos', 'usuario']
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS envios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha TEXT NOT NULL,
+            convocatoria_id TEXT NOT NULL,
+            titulo TEXT NOT NULL,
+            institucion TEXT NOT NULL,
+            total_destinatarios INTEGER NOT NULL,
+            envios_exitosos INTEGER NOT NULL,
+            usuario TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_envios_fecha ON envios (fecha);
+        CREATE INDEX IF NOT EXISTS idx_envios_institucion ON envios (institucion, fecha);
+        CREATE TABLE IF NOT EXISTS totales (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            envios INTEGER NOT NULL,
+            destinatarios INTEGER NOT NULL,
+            exitosos INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO totales VALUES (1, 0, 0, 0);
+        CREATE TABLE IF NOT EXISTS instituciones (
+            institucion TEXT PRIMARY KEY,
+            envios INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, ruta: Path = Path("data") / "envios_log.db",
+                 csv_anterior: Path = Path("data") / "envios_log.csv"):
+        self._conn = conectar_sqlite(ruta)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.ESQUEMA)
+        self._importar_csv(csv_anterior)
+
+    def _importar_csv(self, ruta: Path):
+        """Importa una sola vez el CSV que usaban versiones anteriores."""
+        if not ruta.exists() or self.resumen()['envios']:
+            return
         try:
-            with open(CONVOCATORIAS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(convocatorias, f, ensure_ascii=False, indent=2)
-        except:
+            with open(ruta, 'r', newline='', encoding='utf-8') as f:
+                for fila in csv.DictReader(f):
+                    fila['total_destinatarios'] = int(fila.get('total_destinatarios') or 0)
+                    fila['envios_exitosos'] = int(fila.get('envios_exitosos') or 0)
+                    self.registrar(fila)
+        except (OSError, ValueError, csv.Error):
             pass
-    
-    def cargar_convocatorias(self) -> List[Dict]:
-        DATA_DIR = Path("data")
-        CONVOCATORIAS_FILE = DATA_DIR / "convocatorias_nacionales.json"
-        
-        try:
-            if CONVOCATORIAS_FILE.exists():
-                with open(CONVOCATORIAS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
-        except:
-            return []
 
-# ==================== FUNCIONES DE LOG ====================
+    def registrar(self, entrada: Dict):
+        valores = [entrada.get(campo) for campo in self.CAMPOS]
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO envios ({', '.join(self.CAMPOS)}) VALUES ({', '.join('?' * len(self.CAMPOS))})",
+                valores
+            )
+            self._conn.execute(
+                """UPDATE totales SET envios = envios + 1, destinatarios = destinatarios + ?,
+                                      exitosos = exitosos + ? WHERE id = 1""",
+                (entrada['total_destinatarios'], entrada['envios_exitosos'])
+            )
+            self._conn.execute(
+                """INSERT INTO instituciones (institucion, envios) VALUES (?, 1)
+                   ON CONFLICT (institucion) DO UPDATE SET envios = envios + 1""",
+                (entrada['institucion'],)
+            )
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            totales = self._conn.execute("SELECT envios, destinatarios, exitosos FROM totales").fetchone()
+            instituciones = self._conn.execute("SELECT COUNT(*) FROM instituciones").fetchone()[0]
+        return {**dict(totales), 'instituciones': instituciones}
+
+    def instituciones(self) -> List[str]:
+        with self._lock:
+            return [fila[0] for fila in self._conn.execute("SELECT institucion FROM instituciones ORDER BY 1")]
+
+    def rango_fechas(self):
+        with self._lock:
+            return tuple(self._conn.execute("SELECT MIN(fecha), MAX(fecha) FROM envios").fetchone())
+
+    @staticmethod
+    def _filtro(desde=None, hasta=None, instituciones=None):
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append("fecha >= ?")
+            parametros.append(f"{desde} 00:00:00")
+        if hasta:
+            condiciones.append("fecha <= ?")
+            parametros.append(f"{hasta} 23:59:59")
+        if instituciones:
+            condiciones.append(f"institucion IN ({', '.join('?' * len(instituciones))})")
+            parametros.extend(instituciones)
+        return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), parametros
+
+    def contar(self, desde=None, hasta=None, instituciones=None) -> int:
+        where, parametros = self._filtro(desde, hasta, instituciones)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM envios{where}", parametros).fetchone()[0]
+
+    def consultar(self, desde=None, hasta=None, instituciones=None, limite=50, offset=0) -> List[Dict]:
+        """Una página del historial, del envío más reciente al más antiguo."""
+        where, parametros = self._filtro(desde, hasta, instituciones)
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT {', '.join(self.CAMPOS)} FROM envios{where} ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?",
+                parametros + [limite, offset]
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def exportar_csv(self, desde=None, hasta=None, instituciones=None) -> bytes:
+        where, parametros = self._filtro(desde, hasta, instituciones)
+        salida = StringIO()
+        writer = csv.writer(salida)
+        writer.writerow(self.CAMPOS)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(self.CAMPOS)} FROM envios{where} ORDER BY fecha DESC, id DESC", parametros
+            )
+            for fila in cursor:
+                writer.writerow(fila)
+        return salida.getvalue().encode('utf-8')
+
+
+@recurso_compartido()
+def obtener_historial_envios() -> HistorialEnvios:
+    return HistorialEnvios()
+
+
 def registrar_envio_log(convocatoria_id: str, titulo: str, total: int, exitosos: int):
-    DATA_DIR = Path("data")
-    DATA_DIR.mkdir(exist_ok=True)
-    LOG_FILE = DATA_DIR / "envios_log.csv"
-    
     try:
-        log_entry = {
+        obtener_historial_envios().registrar({
             'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'convocatoria_id': convocatoria_id,
             'titulo': titulo[:100],
@@ -477,43 +2666,201 @@ def registrar_envio_log(convocatoria_id: str, titulo: str, total: int, exitosos:
             'total_destinatarios': total,
             'envios_exitosos': exitosos,
             'usuario': CONFIG.EMAIL_USER
-        }
-        
-        if not LOG_FILE.exists():
-            with open(LOG_FILE, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=log_entry.keys())
-                writer.writeheader()
-                writer.writerow(log_entry)
-        else:
-            with open(LOG_FILE, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=log_entry.keys())
-                writer.writerow(log_entry)
-    except:
-        pass
+        })
+    except Exception as e:
+        METRICAS.error('historial_envios', e)
+
+def normalizar_email(email: str) -> str:
+    return email.strip().lower()
+
+
+class LibroEntregas:
+    """Registro por destinatario de qué convocatoria ya recibió cada correo.
+
+    La tabla ``entregas`` (clave primaria convocatoria + email normalizado)
+    es la fuente de verdad; en memoria se mantiene un ``set`` por
+    convocatoria, así que "¿ya se envió?" (``ya_entregado``) es una consulta
+    O(1). ``entregados`` entrega una copia inmutable que se reutiliza hasta
+    el siguiente ``registrar`` de esa convocatoria.
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS entregas (
+            convocatoria_id TEXT NOT NULL,
+            email TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            PRIMARY KEY (convocatoria_id, email)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, ruta: Path = Path("data") / "envios_log.db"):
+        self._conn = conectar_sqlite(ruta)
+        self._lock = threading.Lock()
+        self._entregados: Dict[str, set] = {}
+        self._copias: Dict[str, frozenset] = {}
+        with self._lock, self._conn:
+            self._conn.executescript(self.ESQUEMA)
+
+    def _conjunto(self, convocatoria_id: str) -> set:
+        # Se llama con el lock tomado
+        emails = self._entregados.get(convocatoria_id)
+        if emails is None:
+            emails = self._entregados[convocatoria_id] = {
+                fila[0] for fila in self._conn.execute(
+                    "SELECT email FROM entregas WHERE convocatoria_id = ?", (convocatoria_id,)
+                )
+            }
+        return emails
+
+    def entregados(self, convocatoria_id: str) -> frozenset:
+        """Emails (normalizados) que ya recibieron ``convocatoria_id``."""
+        with self._lock:
+            copia = self._copias.get(convocatoria_id)
+            if copia is None:
+                copia = self._copias[convocatoria_id] = frozenset(self._conjunto(convocatoria_id))
+            return copia
+
+    def ya_entregado(self, convocatoria_id: str, email: str) -> bool:
+        email = normalizar_email(email)
+        with self._lock:
+            return email in self._conjunto(convocatoria_id)
+
+    def registrar(self, convocatoria_id: str, email: str):
+        email = normalizar_email(email)
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO entregas (convocatoria_id, email, fecha) VALUES (?, ?, ?)",
+                (convocatoria_id, email, ahora)
+            )
+            if convocatoria_id in self._entregados:
+                self._entregados[convocatoria_id].add(email)
+                self._copias.pop(convocatoria_id, None)
+
+
+@recurso_compartido()
+def obtener_libro_entregas() -> LibroEntregas:
+    return LibroEntregas()
+
+
+class ListaRebotes:
+    """Direcciones que el servidor rechazó de forma permanente (RCPT 5xx).
+
+    Las campañas siguientes las omiten. Se guardan el código y la respuesta
+    del servidor para revisarlas y, si se corrige el padrón, rehabilitarlas.
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS rebotes (
+            email TEXT PRIMARY KEY,
+            codigo INTEGER,
+            detalle TEXT NOT NULL,
+            convocatoria_id TEXT,
+            fecha TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, ruta: Path = Path("data") / "envios_log.db"):
+        self._conn = conectar_sqlite(ruta)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.ESQUEMA)
+            self._emails = {fila[0] for fila in self._conn.execute("SELECT email FROM rebotes")}
+        self._copia: Optional[frozenset] = None
+
+    def emails(self) -> frozenset:
+        """Emails (normalizados) en la lista de rebotes."""
+        with self._lock:
+            if self._copia is None:
+                self._copia = frozenset(self._emails)
+            return self._copia
+
+    def registrar(self, email: str, fallo: Fallo, convocatoria_id: Optional[str] = None):
+        email = normalizar_email(email)
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO rebotes (email, codigo, detalle, convocatoria_id, fecha)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (email, fallo.codigo, fallo.detalle, convocatoria_id, ahora)
+            )
+            self._emails.add(email)
+            self._copia = None
+        METRICAS.contar('rebotes_registrados')
+
+    def rehabilitar(self, emails: List[str]):
+        emails = [normalizar_email(e) for e in emails]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM rebotes WHERE email = ?", ((e,) for e in emails))
+            self._emails.difference_update(emails)
+            self._copia = None
+
+    def recientes(self, limite: int = 200) -> List[Dict]:
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT email, codigo, detalle, convocatoria_id, fecha FROM rebotes ORDER BY fecha DESC LIMIT ?",
+                (limite,)
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+
+@recurso_compartido()
+def obtener_lista_rebotes() -> ListaRebotes:
+    return ListaRebotes()
+
+
+def anotar_resultado(convocatoria_id: str, email: str, resultado):
+    """Lleva el resultado definitivo de un envío al libro de entregas o, si la dirección no existe, a los rebotes."""
+    if resultado:
+        obtener_libro_entregas().registrar(convocatoria_id, email)
+    elif isinstance(resultado, Fallo) and resultado.del_buzon:
+        obtener_lista_rebotes().registrar(email, resultado, convocatoria_id)
+
+TAMANO_PAGINA_HISTORIAL = 50
 
 def mostrar_historial():
-    DATA_DIR = Path("data")
-    LOG_FILE = DATA_DIR / "envios_log.csv"
+    historial = obtener_historial_envios()
+    resumen = historial.resumen()
     
-    if not LOG_FILE.exists():
+    if not resumen['envios']:
         st.info("📭 No hay registros de envíos aún.")
         return
     
     try:
-        df_log = pd.read_csv(LOG_FILE)
-        df_log['fecha'] = pd.to_datetime(df_log['fecha'])
-        df_log = df_log.sort_values('fecha', ascending=False)
-        
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("📨 Total de envíos", len(df_log))
+            st.metric("📨 Total de envíos", resumen['envios'])
         with col2:
-            st.metric("👥 Destinatarios", df_log['total_destinatarios'].sum())
+            st.metric("👥 Destinatarios", resumen['destinatarios'])
         with col3:
-            st.metric("✅ Éxitos", df_log['envios_exitosos'].sum())
+            st.metric("✅ Éxitos", resumen['exitosos'])
         with col4:
-            st.metric("🏛️ Instituciones", df_log['institucion'].nunique())
+            st.metric("🏛️ Instituciones", resumen['instituciones'])
+        
+        # Filtros
+        primera, ultima = historial.rango_fechas()
+        primera = datetime.strptime(primera[:10], '%Y-%m-%d').date()
+        ultima = datetime.strptime(ultima[:10], '%Y-%m-%d').date()
+        col_fechas, col_inst = st.columns(2)
+        with col_fechas:
+            rango = st.date_input("Rango de fechas", value=(primera, ultima), key="hist_rango")
+        with col_inst:
+            filtro_inst = st.multiselect("Institución", historial.instituciones(), key="hist_inst")
+        desde = rango[0] if len(rango) > 0 else None
+        hasta = rango[1] if len(rango) > 1 else desde
+        
+        total = historial.contar(desde, hasta, filtro_inst)
+        paginas = max(1, -(-total // TAMANO_PAGINA_HISTORIAL))
+        pagina = st.number_input(f"Página (de {paginas})", 1, paginas, 1, key="hist_pagina")
+        
+        df_log = pd.DataFrame(
+            historial.consultar(desde, hasta, filtro_inst, TAMANO_PAGINA_HISTORIAL,
+                                (pagina - 1) * TAMANO_PAGINA_HISTORIAL),
+            columns=HistorialEnvios.CAMPOS
+        )
+        df_log['fecha'] = pd.to_datetime(df_log['fecha'])
         
+        st.caption(f"{total} envíos con los filtros actuales")
         st.dataframe(
             df_log,
             column_config={
@@ -527,25 +2874,832 @@ def mostrar_historial():
             use_container_width=True
         )
         
-        csv_log = df_log.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Descargar historial completo",
-            data=csv_log,
-            file_name=f"historial_convocatorias_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+        # El CSV sólo se genera cuando se pide, y sólo vale para los filtros con que se generó
+        filtros = (desde, hasta, tuple(filtro_inst))
+        if st.button("📦 Preparar CSV del historial"):
+            st.session_state.historial_csv = (filtros, historial.exportar_csv(desde, hasta, filtro_inst))
+        filtros_csv, csv_historial = st.session_state.get('historial_csv', (None, None))
+        if filtros_csv == filtros:
+            st.download_button(
+                label="📥 Descargar historial",
+                data=csv_historial,
+                file_name=f"historial_convocatorias_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv"
+            )
     except Exception as e:
+        METRICAS.error('historial_envios', e)
         st.error(f"Error al cargar historial: {e}")
 
+def mostrar_rebotes():
+    """Direcciones rechazadas de forma permanente, con la opción de rehabilitarlas."""
+    rebotes = obtener_lista_rebotes()
+    filas = rebotes.recientes()
+    if not filas:
+        return
+    st.markdown("---")
+    st.subheader("🚫 Direcciones que rebotan")
+    st.caption(f"{len(rebotes.emails())} direcciones rechazadas por el servidor; las campañas las omiten")
+    st.dataframe(
+        pd.DataFrame(filas),
+        column_config={
+            "email": "Email",
+            "codigo": "Código",
+            "detalle": st.column_config.TextColumn("Respuesta del servidor", width="large"),
+            "convocatoria_id": "Convocatoria",
+            "fecha": "Fecha",
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    elegidas = st.multiselect("Rehabilitar direcciones corregidas", [fila['email'] for fila in filas],
+                              key="rebotes_rehabilitar")
+    if elegidas and st.button("♻️ Rehabilitar"):
+        rebotes.rehabilitar(elegidas)
+        st.rerun()
+
+def mostrar_metricas():
+    """Latencia por etapa, eventos y errores del proceso (los mismos que se exportan a Prometheus)."""
+    st.markdown("---")
+    st.subheader("⏱️ Rendimiento por etapa")
+    instantaneas = obtener_instantaneas()
+    versiones = []
+    for nombre, etiqueta in (('padron', "Padrón"), ('convocatorias', "Convocatorias")):
+        vigente = instantaneas.actual(nombre)
+        if vigente is not None:
+            en_memoria = ', '.join(f"v{v}" for v in instantaneas.vivas(nombre))
+            versiones.append(f"{etiqueta} v{vigente.version} (en memoria: {en_memoria})")
+    if versiones:
+        st.caption("🗂️ " + " · ".join(versiones))
+    datos = METRICAS.instantanea()
+    if not datos['etapas'] and not datos['eventos']:
+        st.info("Aún no hay mediciones en este proceso.")
+        return
+
+    eventos = datos['eventos']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📤 Correos enviados", eventos.get('correos_enviados', 0))
+    with col2:
+        st.metric("⚠️ Correos fallidos", eventos.get('correos_fallidos', 0))
+    with col3:
+        st.metric("🔁 Reconexiones SMTP", eventos.get('smtp_reconexiones', 0))
+    with col4:
+        st.metric("❌ Errores", sum(e['cuenta'] for e in datos['errores']))
+
+    if METRICAS.ruta is not None:
+        st.caption(f"Exportado en formato Prometheus a `{METRICAS.ruta}` cada 15 s")
+
+    # Las tablas cargan pandas: sólo cuando se piden (la insignia SFTP ya registra
+    # métricas en el primer render, que de otro modo pagaría la importación)
+    if not st.toggle("Ver detalle por etapa, errores y eventos", key="metricas_detalle"):
+        return
+    st.dataframe(
+        pd.DataFrame(datos['etapas'], columns=['etapa', 'llamadas', 'p50_ms', 'p95_ms', 'p99_ms', 'total_s']),
+        column_config={
+            "etapa": "Etapa",
+            "llamadas": "Llamadas",
+            "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+            "p99_ms": st.column_config.NumberColumn("p99 (ms)", format="%.1f"),
+            "total_s": st.column_config.NumberColumn("Total (s)", format="%.2f"),
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+    col_errores, col_eventos = st.columns(2)
+    with col_errores:
+        st.caption("Errores por etapa y tipo")
+        if datos['errores']:
+            st.dataframe(pd.DataFrame(datos['errores']), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Sin errores registrados ✅")
+    with col_eventos:
+        st.caption("Eventos")
+        st.dataframe(pd.DataFrame(list(eventos.items()), columns=['evento', 'cuenta']),
+                     hide_index=True, use_container_width=True)
+
+# ==================== BÚSQUEDA DE INTERESADOS ====================
+PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas y sin acentos: 'José' y 'jose' se comparan igual."""
+    texto = texto or ''
+    if texto.isascii():
+        return texto.lower()
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+def tokenizar(texto: str) -> List[str]:
+    texto = texto or ''
+    if not texto.isascii():
+        # Los tokens sólo llevan [a-z0-9]: basta con tirar lo que no es ASCII tras descomponer
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return PATRON_TOKEN.findall(texto.lower())
+
+
+class IndiceInteresados:
+    """Índice invertido sobre nombre, email y especialidad.
+
+    Cada término de la consulta se busca como prefijo de algún token y los
+    términos se combinan con AND. El vocabulario está ordenado y las
+    posiciones de todos sus tokens van seguidas en un solo arreglo int32,
+    así que un prefijo cualquiera es un tramo contiguo: se resuelve con dos
+    búsquedas binarias y una máscara sobre el padrón, sin tablas de
+    prefijos. Se memorizan las posiciones por término, no las consultas.
+    """
+
+    # Posiciones memorizadas entre todos los términos (~4 MB en int32)
+    MAX_MEMORIZADAS = 1 << 20
+
+    def __init__(self, filas):
+        """``filas``: iterable de (nombre, email, especialidad) en orden de posición."""
+        ids: Dict[str, int] = {}
+        tokens = array.array('i')
+        posiciones = array.array('i')
+        tokens_de: Dict[str, List[int]] = {}  # los campos repetidos (especialidad) se tokenizan una vez
+        total = 0
+        for posicion, campos in enumerate(filas):
+            total += 1
+            for campo in campos:
+                ids_campo = tokens_de.get(campo)
+                if ids_campo is None:
+                    ids_campo = [ids.setdefault(token, len(ids)) for token in tokenizar(campo)]
+                    if len(tokens_de) < 4096:
+                        tokens_de[campo] = ids_campo
+                tokens.extend(ids_campo)
+                posiciones.extend(itertools.repeat(posicion, len(ids_campo)))
+        self.total = total
+        self._vocabulario = sorted(ids)
+
+        # Pares (token, posición) ordenados y sin repetir, con el token ya en orden de vocabulario
+        orden = np.empty(len(ids), dtype=np.int64)
+        orden[np.fromiter((ids[t] for t in self._vocabulario), dtype=np.int64, count=len(ids))] = np.arange(len(ids))
+        pares = np.sort(orden[np.frombuffer(tokens, dtype=np.int32)] * max(total, 1)
+                        + np.frombuffer(posiciones, dtype=np.int32))
+        pares = pares[np.concatenate(([True], pares[1:] != pares[:-1]))] if len(pares) else pares
+        self._posiciones = (pares % max(total, 1)).astype(np.int32)
+        self._limites = np.searchsorted(pares // max(total, 1), np.arange(len(ids) + 1))
+
+        self._memo = OrderedDict()
+        self._memorizadas = 0
+        self._lock = threading.Lock()
+
+    def _coincidencias(self, termino: str) -> np.ndarray:
+        """Posiciones (ordenadas, int32) con algún token que empieza por ``termino``."""
+        with self._lock:
+            memorizado = self._memo.get(termino)
+            if memorizado is not None:
+                self._memo.move_to_end(termino)
+                return memorizado
+        inicio = bisect.bisect_left(self._vocabulario, termino)
+        fin = bisect.bisect_left(self._vocabulario, termino + '\uffff', lo=inicio)
+        tramo = self._posiciones[self._limites[inicio]:self._limites[fin]]
+        if fin - inicio <= 1:
+            # Un solo token: su tramo ya está ordenado y sin repetir
+            return tramo
+        mascara = np.zeros(self.total, dtype=bool)
+        mascara[tramo] = True
+        coincidencias = np.flatnonzero(mascara).astype(np.int32)
+        with self._lock:
+            if termino not in self._memo:
+                self._memo[termino] = coincidencias
+                self._memorizadas += len(coincidencias)
+                while self._memorizadas > self.MAX_MEMORIZADAS and len(self._memo) > 1:
+                    self._memorizadas -= len(self._memo.popitem(last=False)[1])
+        return coincidencias
+
+    def buscar(self, consulta: str) -> Optional[np.ndarray]:
+        """Posiciones ordenadas que cumplen todos los términos; None si la consulta está vacía."""
+        terminos = sorted(set(tokenizar(consulta)))
+        if not terminos:
+            return None
+        conjuntos = sorted((self._coincidencias(t) for t in terminos), key=len)
+        resultado = conjuntos[0]
+        for otro in conjuntos[1:]:
+            if not len(resultado):
+                break
+            mascara = np.zeros(self.total, dtype=bool)
+            mascara[otro] = True
+            resultado = resultado[mascara[resultado]]
+        return resultado
+
+
+def indice_interesados(padron: Instantanea) -> IndiceInteresados:
+    """Un índice por versión del padrón; se libera junto con ella."""
+    return padron.derivado('indice', lambda: IndiceInteresados(
+        zip(padron.datos['nombre'], padron.datos['email'], padron.datos['especialidad'])
+    ))
+
+# ==================== BÚSQUEDA DE CONVOCATORIAS ====================
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
+}
+
+def fecha_limite(plazo: str):
+    """Fecha de cierre contenida en ``plazo`` ('15 de marzo de 2026', '01/04/2026'), o None."""
+    texto = normalizar_texto(plazo)
+    coincidencia = re.search(r'(\d{1,2})\s+de\s+([a-z]+)(?:\s+de)?\s+(\d{4})', texto)
+    try:
+        if coincidencia and coincidencia.group(2) in MESES:
+            dia, mes, anio = coincidencia.groups()
+            return datetime(int(anio), MESES[mes], int(dia)).date()
+        coincidencia = re.search(r'(\d{1,2})/(\d{1,2})/(\d{4})', texto)
+        if coincidencia:
+            dia, mes, anio = coincidencia.groups()
+            return datetime(int(anio), int(mes), int(dia)).date()
+    except ValueError:
+        pass
+    return None
+
+def grupo_plazo(plazo: str, hoy) -> str:
+    limite = fecha_limite(plazo)
+    if limite is None:
+        return "Sin fecha"
+    if limite < hoy:
+        return "Cerrada"
+    if (limite - hoy).days <= 30:
+        return "Cierra en 30 días"
+    return "Más de 30 días"
+
+
+class IndiceConvocatorias:
+    """Búsqueda de texto (BM25 por campos) y facetas sobre las convocatorias.
+
+    Se construye una vez por lista de convocatorias y día: los conjuntos y
+    conteos de cada faceta quedan precalculados, así que filtrar es sólo
+    intersectar conjuntos.
+    """
+
+    PESOS = {'titulo': 3.0, 'entidad': 2.0, 'area': 1.5}
+    FACETAS = ('institucion', 'tipo', 'area', 'plazo')
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, convocatorias: List[Dict], hoy=None):
+        hoy = hoy or datetime.now().date()
+        self.convocatorias = convocatorias
+        self._postings: Dict[str, Dict[int, float]] = {}
+        longitudes = []
+        self._facetas: Dict[str, Dict[str, frozenset]] = {faceta: {} for faceta in self.FACETAS}
+
+        for posicion, convocatoria in enumerate(convocatorias):
+            longitud = 0.0
+            for campo, peso in self.PESOS.items():
+                for token in tokenizar(convocatoria.get(campo, '')):
+                    frecuencias = self._postings.setdefault(token, {})
+                    frecuencias[posicion] = frecuencias.get(posicion, 0.0) + peso
+                    longitud += peso
+            longitudes.append(longitud)
+
+            valores = {
+                'institucion': convocatoria.get('institucion') or 'Sin institución',
+                'tipo': convocatoria.get('tipo') or 'Sin tipo',
+                'area': convocatoria.get('area') or 'Sin área',
+                'plazo': grupo_plazo(convocatoria.get('plazo', ''), hoy),
+            }
+            for faceta, valor in valores.items():
+                self._facetas[faceta].setdefault(valor, set()).add(posicion)
+
+        self._facetas = {
+            faceta: {valor: frozenset(posiciones) for valor, posiciones in sorted(grupos.items())}
+            for faceta, grupos in self._facetas.items()
+        }
+        self._longitudes = longitudes
+        self._longitud_media = (sum(longitudes) / len(longitudes)) if longitudes else 1.0
+        total = len(convocatorias)
+        self._idf = {
+            token: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self._postings.items()
+        }
+        self._vocabulario = sorted(self._postings)
+
+    def valores(self, faceta: str) -> List[str]:
+        return list(self._facetas[faceta])
+
+    def conteo(self, faceta: str, valor: str) -> int:
+        return len(self._facetas[faceta].get(valor, ()))
+
+    def _puntajes_termino(self, termino: str) -> Dict[int, float]:
+        """BM25 del mejor token que empieza por ``termino``, para cada documento."""
+        inicio = bisect.bisect_left(self._vocabulario, termino)
+        fin = bisect.bisect_left(self._vocabulario, termino + '\uffff', lo=inicio)
+        puntajes: Dict[int, float] = {}
+        for token in self._vocabulario[inicio:fin]:
+            idf = self._idf[token]
+            for posicion, tf in self._postings[token].items():
+                normalizacion = 1 - self.B + self.B * self._longitudes[posicion] / self._longitud_media
+                puntaje = idf * tf * (self.K1 + 1) / (tf + self.K1 * normalizacion)
+                if puntaje > puntajes.get(posicion, 0.0):
+                    puntajes[posicion] = puntaje
+        return puntajes
+
+    def buscar(self, texto: str = '', filtros: Optional[Dict[str, List[str]]] = None) -> List[int]:
+        """Posiciones que cumplen texto (AND de prefijos) y facetas, de mayor a menor relevancia."""
+        candidatos = None
+        for faceta, valores in (filtros or {}).items():
+            if not valores:
+                continue
+            grupo = frozenset().union(*(self._facetas[faceta].get(v, frozenset()) for v in valores))
+            candidatos = grupo if candidatos is None else candidatos & grupo
+
+        terminos = set(tokenizar(texto))
+        if not terminos:
+            if candidatos is None:
+                return list(range(len(self.convocatorias)))
+            return sorted(candidatos)
+
+        total: Dict[int, float] = {}
+        for i, termino in enumerate(terminos):
+            puntajes = self._puntajes_termino(termino)
+            if i == 0:
+                total = {p: v for p, v in puntajes.items() if candidatos is None or p in candidatos}
+            else:
+                total = {p: v + puntajes[p] for p, v in total.items() if p in puntajes}
+            if not total:
+                return []
+        return sorted(total, key=lambda p: (-total[p], p))
+
+
+def indice_convocatorias(convocatorias: Instantanea, dia: str) -> IndiceConvocatorias:
+    """Un índice por versión de las convocatorias y día (por la faceta de plazo)."""
+    return convocatorias.derivado(('indice', dia), lambda: IndiceConvocatorias(convocatorias.datos))
+
+TAMANO_PAGINA_CONVOCATORIAS = 20
+ETIQUETAS_FACETAS = {'institucion': "Institución", 'tipo': "Tipo", 'area': "Área", 'plazo': "Plazo"}
+
+# ==================== RELEVANCIA CONVOCATORIA-INTERESADO ====================
+PALABRAS_VACIAS = frozenset(
+    'de la el en y para los las del por con al a un una o e su sus sobre entre no especificada'.split()
+)
+
+def raices(texto: str) -> List[str]:
+    """Tokens normalizados y recortados a 6 letras ('cardiología'/'cardiólogo' -> 'cardio')."""
+    return [t[:6] for t in tokenizar(texto) if len(t) > 2 and t not in PALABRAS_VACIAS]
+
+
+class MotorRelevancia:
+    """Relevancia TF-IDF (coseno) entre convocatorias y especialidades de interesados.
+
+    Las especialidades se factorizan: se calcula una fila por especialidad
+    distinta y se reparte a cada interesado con su código, así que el costo
+    no crece con el número de personas sino con el de especialidades. Sólo
+    se conservan los términos presentes en ambos lados (los únicos que
+    aportan al producto punto). Las convocatorias forman una matriz densa y
+    las especialidades una dispersa en formato CSR; todo se opera con NumPy.
+    """
+
+    def __init__(self, convocatorias: List[Dict], especialidades):
+        """``especialidades``: una por interesado; si ya es categórica (padrón) se usan sus códigos."""
+        if isinstance(getattr(especialidades, 'dtype', None), pd.CategoricalDtype):
+            codigos, unicas = especialidades.cat.codes.to_numpy(), especialidades.cat.categories
+        else:
+            codigos, unicas = pd.factorize(pd.Series(list(especialidades), dtype=object).fillna(''))
+        self.codigos = codigos.astype(np.int32)
+        self.num_convocatorias = len(convocatorias)
+
+        docs_conv = [
+            raices(' '.join((c.get('titulo', ''), c.get('area', ''), c.get('tipo', ''))))
+            for c in convocatorias
+        ]
+        docs_esp = [raices(especialidad) for especialidad in unicas]
+        vocabulario = sorted({t for d in docs_conv for t in d} & {t for d in docs_esp for t in d})
+        columna = {t: i for i, t in enumerate(vocabulario)}
+
+        frecuencia_doc = np.zeros(len(vocabulario), dtype=np.float32)
+        for doc in docs_conv + docs_esp:
+            for t in set(doc):
+                if t in columna:
+                    frecuencia_doc[columna[t]] += 1
+        total_docs = len(docs_conv) + len(docs_esp)
+        idf = np.log((1 + total_docs) / (1 + frecuencia_doc)) + 1
+
+        self._c = np.zeros((len(docs_conv), len(vocabulario)), dtype=np.float32)
+        for fila, doc in enumerate(docs_conv):
+            for t in doc:
+                if t in columna:
+                    self._c[fila, columna[t]] += 1
+        self._c *= idf
+        normas = np.linalg.norm(self._c, axis=1, keepdims=True)
+        np.divide(self._c, normas, out=self._c, where=normas > 0)
+
+        indptr, indices, datos = [0], [], []
+        for doc in docs_esp:
+            conteo = Counter(columna[t] for t in doc if t in columna)
+            if conteo:
+                cols = np.fromiter(conteo.keys(), dtype=np.int32, count=len(conteo))
+                vals = np.fromiter(conteo.values(), dtype=np.float32, count=len(conteo)) * idf[cols]
+                vals /= np.linalg.norm(vals)
+                indices.append(cols)
+                datos.append(vals)
+            indptr.append(indptr[-1] + len(conteo))
+        self._e_indptr = np.asarray(indptr, dtype=np.int64)
+        self._e_indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+        self._e_datos = np.concatenate(datos) if datos else np.zeros(0, dtype=np.float32)
+
+    def _puntajes_especialidades(self, columnas_c: np.ndarray) -> np.ndarray:
+        """Producto CSR x denso: (especialidades distintas) x (columnas de ``columnas_c``)."""
+        num_esp = len(self._e_indptr) - 1
+        if not len(self._e_datos):
+            return np.zeros((num_esp, columnas_c.shape[1]), dtype=np.float32)
+        productos = self._e_datos[:, None] * columnas_c[self._e_indices]
+        productos = np.vstack([productos, np.zeros((1, columnas_c.shape[1]), dtype=np.float32)])
+        sumas = np.add.reduceat(productos, self._e_indptr[:-1], axis=0)
+        sumas[self._e_indptr[:-1] == self._e_indptr[1:]] = 0
+        return sumas
+
+    def puntajes_interesados(self, convocatoria: int) -> np.ndarray:
+        """Relevancia de la convocatoria para cada interesado (en orden de posición)."""
+        por_especialidad = self._puntajes_especialidades(self._c[convocatoria][:, None])[:, 0]
+        return por_especialidad[self.codigos]
+
+    def sugerir_destinatarios(self, convocatoria: int, n: int = 50) -> List[int]:
+        """Posiciones de los ``n`` interesados más afines (con puntaje > 0)."""
+        puntajes = self.puntajes_interesados(convocatoria)
+        candidatos = np.flatnonzero(puntajes > 0)
+        if len(candidatos) > n:
+            candidatos = candidatos[np.argpartition(-puntajes[candidatos], n - 1)[:n]]
+        return candidatos[np.argsort(-puntajes[candidatos], kind='stable')].tolist()
+
+
+def motor_relevancia(convocatorias: Instantanea, padron: Instantanea) -> MotorRelevancia:
+    """Un motor por par de versiones; se guarda en el padrón (no retiene las convocatorias)."""
+    return padron.derivado(('relevancia', convocatorias.version),
+                           lambda: MotorRelevancia(convocatorias.datos, padron.datos['especialidad']))
+
+TAMANO_PAGINA_SELECTOR = 100
+SIN_SELECCION = ()
+
+def seleccion_actual() -> np.ndarray:
+    """Posiciones (ordenadas, sin repetir) de los interesados seleccionados en el padrón de la sesión."""
+    return np.asarray(st.session_state.get('seleccion_interesados', SIN_SELECCION), dtype=np.int64)
+
+def fijar_seleccion(posiciones):
+    st.session_state.seleccion_interesados = np.unique(np.asarray(posiciones, dtype=np.int64))
+
+def trasladar_seleccion(anterior: pd.DataFrame, nuevo: pd.DataFrame, posiciones: np.ndarray) -> np.ndarray:
+    """Posiciones en ``nuevo`` de los emails seleccionados en ``anterior`` (al recargar el padrón)."""
+    if not len(posiciones):
+        return posiciones
+    return np.flatnonzero(marcar_emails(nuevo, anterior['email'].take(posiciones)))
+
+def aplicar_edicion_seleccion(clave_editor: str, posiciones: List[int]):
+    """Vuelca a la selección las casillas cambiadas en la página visible del selector."""
+    agregar, quitar = [], []
+    for fila, cambios in st.session_state[clave_editor].get('edited_rows', {}).items():
+        if 'seleccionado' in cambios:
+            (agregar if cambios['seleccionado'] else quitar).append(posiciones[int(fila)])
+    fijar_seleccion(np.setdiff1d(np.union1d(seleccion_actual(), agregar), quitar))
+
+@fragmento(run_every=3)
+def mostrar_cola_envios():
+    """Progreso de las campañas encoladas; se refresca solo, sin rerun completo."""
+    campanas = obtener_cola_envios().recientes(5)
+    if not campanas:
+        return
+
+    st.markdown("---")
+    st.subheader("📬 Campañas en segundo plano")
+    for campana in campanas:
+        avance = campana['procesados'] / campana['total'] if campana['total'] else 1.0
+        etiqueta = f"#{campana['id']} {campana['titulo'][:50]} — {campana['estado']}"
+        st.progress(avance, text=f"{etiqueta} ({campana['exitosos']}/{campana['total']} enviados)")
+        if campana['estado'] == 'detenida':
+            st.error(f"El servidor rechazó la campaña: {campana['motivo']}")
+            if st.button("▶️ Reanudar", key=f"reanudar_{campana['id']}",
+                         help="Tras corregir la configuración; se envía sólo a los pendientes"):
+                obtener_cola_envios().reanudar(campana['id'])
+                obtener_trabajador_envios().despertar()
+
+# ==================== MODO HEADLESS: CLI Y PROGRAMADOR ====================
+def duracion(texto: str) -> float:
+    """'90s', '30m', '6h' o '7d' (segundos si no lleva unidad) -> segundos."""
+    unidades = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    texto = texto.strip().lower()
+    try:
+        if texto and texto[-1] in unidades:
+            return float(texto[:-1]) * unidades[texto[-1]]
+        return float(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"duración inválida: {texto!r}") from None
+
+
+def entregar(convocatoria_id: str, titulo: str, plantilla: PlantillaCorreo, destinatarios: pd.DataFrame,
+             workers: int = 4, tasa: float = 5.0, rafaga: int = 5, por_sobre: Optional[int] = None) -> tuple:
+    """Envía ``plantilla`` a quien aún no haya recibido ``convocatoria_id``; devuelve (exitosos, omitidos).
+
+    ``destinatarios`` es un padrón (o una parte); se omiten también las
+    direcciones de la lista de rebotes. No pasa por ColaEnvios (la
+    atiende el proceso de la app): si el proceso se interrumpe, el libro de
+    entregas evita repetir envíos al reanudar. Los fallos transitorios se
+    reintentan con espera exponencial; si el servidor rechaza la campaña
+    entera se lanza ``CampanaDetenida``. Con ``por_sobre`` el envío es
+    en modo CCO: un mismo mensaje, sin saludo, para cada lote de destinatarios.
+    """
+    omitir = marcar_emails(destinatarios, obtener_libro_entregas().entregados(convocatoria_id))
+    omitir |= marcar_emails(destinatarios, obtener_lista_rebotes().emails())
+    faltan = destinatarios[~omitir]
+    pendientes = list(zip(faltan['nombre'], faltan['email']))
+    procesados = 0
+
+    def anotar(destinatario, resultado):
+        nonlocal procesados
+        anotar_resultado(convocatoria_id, destinatario[1], resultado)
+        procesados += 1
+        if procesados % 100 == 0 or procesados == len(pendientes):
+            registro.info("%s: %d/%d procesados", convocatoria_id, procesados, len(pendientes))
+
+    envios, enviar_uno, al_avanzar = preparar_envios(
+        plantilla, pendientes, por_sobre, email=lambda d: d[1], nombre=lambda d: d[0], anotar=anotar
+    )
+    exitosos = despachar_correos(envios, enviar_uno, workers, tasa, rafaga, al_avanzar, PoliticaReintentos())
+    if exitosos > 0:
+        registrar_envio_log(convocatoria_id, titulo, len(pendientes), exitosos)
+    return exitosos, len(destinatarios) - len(pendientes)
+
+
+def mensaje_resumen(convocatorias: List[Dict], desde: str) -> str:
+    """Cuerpo del resumen periódico de convocatorias nuevas."""
+    lineas = [f"Estas son las convocatorias nacionales publicadas desde el {desde}:", ""]
+    for conv in convocatorias:
+        lineas += [
+            f"🎯 **{conv['titulo']}**",
+            f"🏛️ {conv['institucion']} · {conv['tipo']} · ⏰ Cierre: {conv['plazo']}",
+            f"🔗 {conv['enlace']}",
+            "",
+        ]
+    lineas += ["Atentamente,", "**Sistema de Convocatorias Nacionales**", "INCICh - Instituto Nacional de Cardiología"]
+    return "\n".join(lineas)
+
+
+class EstadoProgramador:
+    """Última ejecución de cada tarea del programador, para que sobreviva a reinicios."""
+
+    def __init__(self, ruta: Path = Path("data") / "programador.db"):
+        self._conn = conectar_sqlite(ruta)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tareas (nombre TEXT PRIMARY KEY, ultima REAL NOT NULL)"
+            )
+
+    def ultima(self, tarea: str) -> Optional[float]:
+        with self._lock:
+            fila = self._conn.execute("SELECT ultima FROM tareas WHERE nombre = ?", (tarea,)).fetchone()
+        return fila['ultima'] if fila else None
+
+    def marcar(self, tarea: str, instante: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO tareas (nombre, ultima) VALUES (?, ?) "
+                "ON CONFLICT (nombre) DO UPDATE SET ultima = excluded.ultima",
+                (tarea, instante)
+            )
+
+
+class Programador:
+    """Cosecha cada fuente con su propio intervalo y envía un resumen periódico.
+
+    Las fuentes vencidas se consultan juntas (en paralelo) y lo encontrado se
+    guarda en el AlmacenConvocatorias. El resumen lista las convocatorias que
+    aparecieron desde el anterior (incluido su día) y se entrega a todos los
+    interesados activos; si no hay a quién enviarlo se reintenta más tarde.
+    """
+
+    TAREA_RESUMEN = 'resumen'
+    REINTENTO_RESUMEN = 900
+
+    def __init__(self, buscador: BuscadorConvocatoriasNacionales, intervalo: float = 12 * 3600,
+                 intervalos: Optional[Dict[str, float]] = None, resumen_cada: float = 7 * 86400,
+                 estado: Optional[EstadoProgramador] = None, workers: int = 4, tasa: float = 5.0,
+                 rafaga: int = 5, por_sobre: Optional[int] = None):
+        self.buscador = buscador
+        self.intervalo = intervalo
+        self.intervalos = intervalos or {}
+        self.resumen_cada = resumen_cada
+        self.estado = estado or EstadoProgramador()
+        self.envio = {'workers': workers, 'tasa': tasa, 'rafaga': rafaga, 'por_sobre': por_sobre}
+        self._reintento_resumen = float('-inf')
+
+    def _proxima(self, tarea: str, intervalo: float) -> float:
+        ultima = self.estado.ultima(tarea)
+        return float('-inf') if ultima is None else ultima + intervalo
+
+    def proximas(self) -> Dict[str, float]:
+        """Instante (epoch) en que vence cada tarea."""
+        tareas = {
+            f"fuente:{nombre}": self._proxima(f"fuente:{nombre}", self.intervalos.get(nombre, self.intervalo))
+            for nombre, _ in self.buscador.fuentes()
+        }
+        if self.resumen_cada:
+            tareas[self.TAREA_RESUMEN] = max(
+                self._proxima(self.TAREA_RESUMEN, self.resumen_cada), self._reintento_resumen
+            )
+        return tareas
+
+    def cosechar(self, fuentes: List[str], ahora: float) -> int:
+        """Consulta ``fuentes`` y guarda lo encontrado; devuelve cuántas convocatorias son nuevas."""
+        self.buscador.fecha_actual = datetime.now().strftime("%Y-%m-%d")
+        resultados = self.buscador.consultar_fuentes(fuentes)
+        convocatorias = [c for nombre in fuentes for c in resultados.get(nombre, [])]
+        nuevas = self.buscador.guardar_convocatorias(convocatorias) if convocatorias else 0
+        for nombre in fuentes:
+            self.estado.marcar(f"fuente:{nombre}", ahora)
+        registro.info("Cosecha %s: %d convocatorias, %d nuevas", ', '.join(fuentes), len(convocatorias), nuevas)
+        return nuevas
+
+    def enviar_resumen(self, ahora: float, desde: Optional[str] = None) -> int:
+        """Envía el resumen de lo aparecido desde ``desde`` (o desde el último); devuelve los exitosos."""
+        if desde is None:
+            ultima = self.estado.ultima(self.TAREA_RESUMEN)
+            desde = datetime.fromtimestamp(ahora - self.resumen_cada if ultima is None else ultima).strftime('%Y-%m-%d')
+        convocatorias = obtener_almacen_convocatorias().consultar(nuevas_desde=desde)
+        if not convocatorias:
+            registro.info("Resumen: sin convocatorias nuevas desde %s", desde)
+            self.estado.marcar(self.TAREA_RESUMEN, ahora)
+            return 0
+
+        destinatarios = obtener_interesados_activos()
+        if destinatarios.empty:
+            registro.warning("Resumen: no se pudo obtener la lista de interesados; se reintentará")
+            self._reintento_resumen = ahora + self.REINTENTO_RESUMEN
+            return 0
+
+        hoy = datetime.fromtimestamp(ahora).strftime('%Y-%m-%d')
+        titulo = f"Resumen de convocatorias nacionales {desde} a {hoy}"
+        plantilla = PlantillaCorreo(f"🇲🇽 {titulo}", mensaje_resumen(convocatorias, desde))
+        try:
+            exitosos, omitidos = entregar(f"RESUMEN-{hoy}", titulo, plantilla, destinatarios, **self.envio)
+        except CampanaDetenida as e:
+            registro.error("Resumen: el servidor rechazó el envío (%s); se reintentará", e)
+            self._reintento_resumen = ahora + self.REINTENTO_RESUMEN
+            return 0
+        registro.info("Resumen: %d convocatorias, %d enviados, %d omitidos", len(convocatorias), exitosos, omitidos)
+        self.estado.marcar(self.TAREA_RESUMEN, ahora)
+        return exitosos
+
+    def paso(self) -> float:
+        """Ejecuta las tareas vencidas; devuelve los segundos hasta la siguiente."""
+        ahora = time.time()
+        vencidas = [tarea for tarea, instante in self.proximas().items() if instante <= ahora]
+        fuentes = [tarea.split(':', 1)[1] for tarea in vencidas if tarea.startswith('fuente:')]
+        if fuentes:
+            self.cosechar(fuentes, ahora)
+        if self.TAREA_RESUMEN in vencidas:
+            self.enviar_resumen(ahora)
+        return max(0.0, min(self.proximas().values()) - time.time())
+
+    def ejecutar(self, una_vez: bool = False):
+        while True:
+            espera = self.paso()
+            if una_vez:
+                return
+            registro.info("Próxima tarea en %.0f s", espera)
+            time.sleep(max(1.0, espera))
+
+
+def cli(argv=None) -> int:
+    """``python -m convocatorias_cientificas1 {buscar,enviar,resumen,run}`` sin Streamlit."""
+    parser = argparse.ArgumentParser(
+        prog="python -m convocatorias_cientificas1",
+        description="Búsqueda, envío y programador de convocatorias sin interfaz. Los secretos se "
+                    "leen de variables de entorno (SMTP_SERVER, REMOTE_HOST...) o de .streamlit/secrets.toml."
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help='registro detallado')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    buscar = comandos.add_parser('buscar', help='consulta las fuentes y guarda lo encontrado')
+    buscar.add_argument('--fuente', action='append', metavar='FUENTE', help='sólo esta fuente (repetible)')
+
+    enviar = comandos.add_parser('enviar', help='anuncia una convocatoria a los interesados activos')
+    enviar.add_argument('convocatoria', help='id de la convocatoria guardada')
+    enviar.add_argument('--asunto', help='asunto (por omisión, el de la app)')
+    enviar.add_argument('--mensaje', type=Path, metavar='ARCHIVO', help='archivo con el cuerpo del correo')
+    enviar.add_argument('--relevantes', type=int, metavar='N', help='sólo los N interesados más afines')
+
+    resumen = comandos.add_parser('resumen', help='envía ahora el resumen de convocatorias nuevas')
+    resumen.add_argument('--desde', metavar='AAAA-MM-DD', help='por omisión, la fecha del último resumen')
+
+    programar = comandos.add_parser('run', help='programador: cosecha por fuente y resumen periódico')
+    programar.add_argument('--cada', type=duracion, default=duracion('12h'),
+                           help='intervalo de consulta por omisión (p. ej. 30m, 6h, 1d)')
+    programar.add_argument('--intervalo', action='append', default=[], metavar='FUENTE=DURACIÓN',
+                           help='intervalo propio de una fuente (repetible)')
+    programar.add_argument('--resumen-cada', type=duracion, default=duracion('7d'),
+                           help='periodicidad del resumen; 0 lo desactiva')
+    programar.add_argument('--una-vez', action='store_true', help='ejecuta lo vencido y termina (para cron)')
+
+    for subparser in (enviar, resumen, programar):
+        subparser.add_argument('--workers', type=int, default=4, help='conexiones SMTP simultáneas')
+        subparser.add_argument('--tasa', type=float, default=5.0, help='correos por segundo')
+        subparser.add_argument('--rafaga', type=int, default=5, help='ráfaga máxima')
+        subparser.add_argument('--cco', type=int, metavar='N',
+                               help='anuncio en bloque: un mismo mensaje, sin saludo, a hasta N destinatarios por sobre')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    registro.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    if not args.verbose:
+        # Los fallos de cada fuente ya se reportan por fuente
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+    exportar_metricas()
+
+    buscador = BuscadorConvocatoriasNacionales()
+    nombres = {normalizar_texto(nombre): nombre for nombre, _ in buscador.fuentes()}
+
+    def fuente(texto):
+        if normalizar_texto(texto) not in nombres:
+            parser.error(f"fuente desconocida: {texto} (disponibles: {', '.join(nombres.values())})")
+        return nombres[normalizar_texto(texto)]
+
+    if args.comando == 'buscar':
+        fuentes = [fuente(f) for f in args.fuente] if args.fuente else None
+        resultados = buscador.consultar_fuentes(fuentes)
+        convocatorias = [c for nombre, _ in buscador.fuentes() for c in resultados.get(nombre, [])]
+        nuevas = buscador.guardar_convocatorias(convocatorias) if convocatorias else 0
+        for nombre, encontradas in resultados.items():
+            print(f"{nombre}: {len(encontradas)}")
+        print(f"{len(convocatorias)} convocatorias, {nuevas} nuevas")
+        return 0 if resultados else 1
+
+    envio = {'workers': args.workers, 'tasa': args.tasa, 'rafaga': args.rafaga, 'por_sobre': args.cco}
+
+    if args.comando == 'enviar':
+        candidatas = [c for c in obtener_almacen_convocatorias().consultar() if c['id'] == args.convocatoria]
+        if not candidatas:
+            registro.error("No hay ninguna convocatoria guardada con id %s", args.convocatoria)
+            return 1
+        conv = max(candidatas, key=lambda c: c['ultima_vez'])
+        destinatarios = obtener_interesados_activos()
+        if destinatarios.empty:
+            registro.error("No se pudo obtener la lista de interesados")
+            return 1
+        if args.relevantes:
+            motor = MotorRelevancia([conv], destinatarios['especialidad'])
+            destinatarios = destinatarios.iloc[motor.sugerir_destinatarios(0, args.relevantes)]
+        mensaje = args.mensaje.read_text(encoding='utf-8') if args.mensaje else mensaje_convocatoria(conv)
+        plantilla = PlantillaCorreo(args.asunto or asunto_convocatoria(conv), mensaje)
+        try:
+            exitosos, omitidos = entregar(conv['id'], conv['titulo'], plantilla, destinatarios, **envio)
+        except CampanaDetenida as e:
+            registro.error("%s: el servidor rechazó el envío: %s", conv['id'], e)
+            return 1
+        print(f"{conv['id']}: {exitosos} enviados, {omitidos} omitidos (ya la tenían o rebotan), "
+              f"{len(destinatarios) - omitidos - exitosos} fallidos")
+        return 0
+
+    intervalos = {}
+    for especificacion in getattr(args, 'intervalo', []):
+        nombre, _, valor = especificacion.partition('=')
+        try:
+            intervalos[fuente(nombre)] = duracion(valor)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+    programador = Programador(
+        buscador,
+        intervalo=getattr(args, 'cada', 12 * 3600),
+        intervalos=intervalos,
+        resumen_cada=getattr(args, 'resumen_cada', 7 * 86400),
+        **envio
+    )
+    if args.comando == 'resumen':
+        print(f"{programador.enviar_resumen(time.time(), desde=args.desde)} resúmenes enviados")
+        return 0
+
+    try:
+        programador.ejecutar(una_vez=args.una_vez)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
 # ==================== INTERFAZ PRINCIPAL SIMPLIFICADA ====================
 def main():
+    st.set_page_config(
+        page_title="Buscador de Convocatorias Nacionales",
+        page_icon="🇲🇽",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    
     # Verificar configuración
     try:
         test = CONFIG.EMAIL_USER
-    except:
+    except Exception:
         st.error("❌ Error de configuración. Verifica secrets.toml")
         st.stop()
     
+    exportar_metricas()
+
+    # Reanuda campañas interrumpidas y atiende las nuevas
+    obtener_trabajador_envios()
+    
+    # Padrón y convocatorias: las últimas versiones publicadas, compartidas por todas las sesiones
+    adoptar_instantaneas()
+    
     # Título
     st.title("🇲🇽 Buscador y Envío de Convocatorias Nacionales")
     st.markdown("---")
@@ -567,23 +3721,22 @@ def main():
         st.header("⚙️ Control Rápido")
         
         # Cargar interesados
+        forzar_descarga = st.checkbox("Forzar descarga completa", key="forzar_descarga")
         if st.button("👥 Cargar Lista de Interesados", use_container_width=True):
             with st.spinner("Cargando..."):
-                interesados = obtener_interesados_activos()
-                if interesados:
-                    st.success(f"✅ {len(interesados)} interesados activos")
-                    st.session_state.interesados = interesados
+                interesados = publicar_padron(forzar=forzar_descarga)
+                if interesados is not None:
+                    adoptar_instantaneas()
+                    st.success(f"✅ {len(interesados)} interesados activos (versión {interesados.version})")
                 else:
                     st.error("❌ No se cargaron interesados")
         
         # Buscar convocatorias
         if st.button("🔍 Buscar Todas las Convocatorias", use_container_width=True, type="primary"):
-            buscador = BuscadorConvocatoriasNacionales()
             with st.spinner("Buscando en todas las instituciones..."):
-                convocatorias = buscador.buscar_todas()
-                if convocatorias:
-                    buscador.guardar_convocatorias(convocatorias)
-                    st.session_state.convocatorias = convocatorias
+                convocatorias = publicar_convocatorias(forzar=True)
+                if convocatorias is not None:
+                    adoptar_instantaneas()
                     st.success(f"✅ {len(convocatorias)} convocatorias encontradas")
                 else:
                     st.error("❌ No se encontraron convocatorias")
@@ -619,12 +3772,8 @@ def main():
         if 'convocatorias' not in st.session_state:
             st.warning("⚠️ Primero busca las convocatorias usando el botón en el sidebar")
             if st.button("🔍 Buscar Ahora", use_container_width=True):
-                buscador = BuscadorConvocatoriasNacionales()
                 with st.spinner("Buscando convocatorias..."):
-                    convocatorias = buscador.buscar_todas()
-                    if convocatorias:
-                        buscador.guardar_convocatorias(convocatorias)
-                        st.session_state.convocatorias = convocatorias
+                    if publicar_convocatorias() is not None:
                         st.rerun()
         elif 'interesados' not in st.session_state:
             st.warning("⚠️ Carga la lista de interesados desde el sidebar")
@@ -635,37 +3784,46 @@ def main():
             with col_conv:
                 st.subheader("🏛️ Convocatorias Disponibles")
                 
-                # Filtros rápidos
-                instituciones = list(set([c['institucion'] for c in st.session_state.convocatorias]))
-                tipos = list(set([c['tipo'] for c in st.session_state.convocatorias]))
+                instantanea_conv = st.session_state.convocatorias
+                convocatorias = instantanea_conv.datos
+                indice = indice_convocatorias(instantanea_conv, datetime.now().strftime('%Y-%m-%d'))
                 
-                filtro_institucion = st.multiselect("Filtrar por Institución", instituciones, default=instituciones, key="filtro_inst")
-                filtro_tipo = st.multiselect("Filtrar por Tipo", tipos, default=tipos, key="filtro_tipo")
+                # Búsqueda de texto y facetas (conteos precalculados en el índice)
+                texto_conv = st.text_input("🔎 Buscar en título, entidad o área", key="texto_conv")
+                filtros = {}
+                columnas_facetas = st.columns(2)
+                for i, faceta in enumerate(IndiceConvocatorias.FACETAS):
+                    with columnas_facetas[i % 2]:
+                        filtros[faceta] = st.multiselect(
+                            f"Filtrar por {ETIQUETAS_FACETAS[faceta]}",
+                            indice.valores(faceta),
+                            format_func=lambda v, faceta=faceta: f"{v} ({indice.conteo(faceta, v)})",
+                            key=f"faceta_{faceta}"
+                        )
                 
-                # Aplicar filtros
-                convocatorias_filtradas = st.session_state.convocatorias
-                if filtro_institucion:
-                    convocatorias_filtradas = [c for c in convocatorias_filtradas if c['institucion'] in filtro_institucion]
-                if filtro_tipo:
-                    convocatorias_filtradas = [c for c in convocatorias_filtradas if c['tipo'] in filtro_tipo]
+                posiciones = indice.buscar(texto_conv, filtros)
                 
-                # Mostrar convocatorias con radio button
-                st.write(f"**{len(convocatorias_filtradas)} convocatorias encontradas**")
+                # Mostrar convocatorias con radio button, una página a la vez
+                st.write(f"**{len(posiciones)} convocatorias encontradas**")
                 
-                opciones_conv = {}
-                for i, conv in enumerate(convocatorias_filtradas):
-                    opciones_conv[f"{conv['institucion']} - {conv['titulo'][:50]}..."] = conv
+                paginas = max(1, -(-len(posiciones) // TAMANO_PAGINA_CONVOCATORIAS))
+                pagina = 1
+                if paginas > 1:
+                    pagina = st.number_input(f"Página (de {paginas})", 1, paginas, 1, key="pagina_convocatorias")
+                inicio = (pagina - 1) * TAMANO_PAGINA_CONVOCATORIAS
+                opciones_conv = posiciones[inicio:inicio + TAMANO_PAGINA_CONVOCATORIAS]
                 
+                seleccion_conv = None
                 if opciones_conv:
-                    seleccion = st.radio(
+                    seleccion = seleccion_conv = st.radio(
                         "Selecciona una convocatoria:",
-                        options=list(opciones_conv.keys()),
+                        options=opciones_conv,
                         key="conv_seleccionada",
-                        format_func=lambda x: f"**{x}**"
+                        format_func=lambda p: f"**{convocatorias[p]['institucion']} - {convocatorias[p]['titulo'][:50]}...**"
                     )
                     
-                    if seleccion:
-                        conv_seleccionada = opciones_conv[seleccion]
+                    if seleccion is not None:
+                        conv_seleccionada = convocatorias[seleccion]
                         st.session_state.convocatoria_seleccionada = conv_seleccionada
                         
                         # Mostrar detalles
@@ -681,39 +3839,89 @@ def main():
                 st.subheader("👥 Interesados Activos")
                 
                 # Mostrar resumen
-                st.metric("Total interesados", len(st.session_state.interesados))
+                instantanea_padron = st.session_state.interesados
+                st.metric("Total interesados", len(instantanea_padron))
+                st.caption(f"Padrón v{instantanea_padron.version}, "
+                           f"publicado {instantanea_padron.publicada.strftime('%d/%m %H:%M')}")
                 
                 # Búsqueda en interesados
-                busqueda = st.text_input("🔍 Buscar por nombre o email", placeholder="Escribe para filtrar...")
+                busqueda = st.text_input("🔍 Buscar por nombre, email o especialidad", placeholder="Escribe para filtrar...")
                 
-                # Filtrar interesados
-                interesados_filtrados = st.session_state.interesados
+                # Filtrar interesados: posiciones sobre el padrón compartido, sin copiar filas
+                padron = instantanea_padron.datos
+                filtrada = np.arange(len(padron))
                 if busqueda:
-                    busqueda_lower = busqueda.lower()
-                    interesados_filtrados = [
-                        i for i in interesados_filtrados 
-                        if busqueda_lower in i['nombre'].lower() or busqueda_lower in i['email'].lower()
-                    ]
+                    posiciones = indice_interesados(instantanea_padron).buscar(busqueda)
+                    if posiciones is not None:
+                        filtrada = posiciones.astype(np.int64)
+                
+                # Quien ya recibió la convocatoria seleccionada no vuelve a ofrecerse
+                entregado = np.zeros(len(padron), dtype=bool)
+                if 'convocatoria_seleccionada' in st.session_state:
+                    entregados = obtener_libro_entregas().entregados(st.session_state.convocatoria_seleccionada['id'])
+                    if entregados:
+                        entregado = marcar_emails(padron, entregados)
+                        antes = len(filtrada)
+                        filtrada = filtrada[~entregado[filtrada]]
+                        if antes > len(filtrada):
+                            st.caption(f"✉️ {antes - len(filtrada)} ya recibieron esta convocatoria")
+                
+                # Selector de destinatarios: la selección son posiciones en el padrón
+                st.write(f"**{len(filtrada)} interesados mostrados**")
+                
+                if seleccion_conv is not None:
+                    col_num, col_sugerir = st.columns([1, 2])
+                    with col_num:
+                        num_sugeridos = st.number_input("Sugeridos", 1, 5000, 50, key="num_sugeridos")
+                    with col_sugerir:
+                        if st.button("✨ Sugerir por especialidad", use_container_width=True):
+                            motor = motor_relevancia(instantanea_conv, instantanea_padron)
+                            sugeridos = np.asarray(motor.sugerir_destinatarios(seleccion_conv, num_sugeridos), dtype=np.int64)
+                            nuevos = sugeridos[~entregado[sugeridos]]
+                            fijar_seleccion(np.union1d(seleccion_actual(), nuevos))
+                            st.caption(f"✨ {len(nuevos)} interesados afines agregados")
+                
+                col_todos, col_ninguno = st.columns(2)
+                with col_todos:
+                    if st.button("✓ Seleccionar filtrados", use_container_width=True):
+                        fijar_seleccion(np.union1d(seleccion_actual(), filtrada))
+                with col_ninguno:
+                    if st.button("✗ Quitar filtrados", use_container_width=True):
+                        fijar_seleccion(np.setdiff1d(seleccion_actual(), filtrada))
+                seleccion = seleccion_actual()
                 
-                # Selector de destinatarios
-                st.write(f"**{len(interesados_filtrados)} interesados mostrados**")
+                paginas = max(1, -(-len(filtrada) // TAMANO_PAGINA_SELECTOR))
+                pagina = 1
+                if paginas > 1:
+                    pagina = st.number_input(f"Página (de {paginas})", 1, paginas, 1, key="pagina_interesados")
+                inicio = (pagina - 1) * TAMANO_PAGINA_SELECTOR
+                en_pagina = filtrada[inicio:inicio + TAMANO_PAGINA_SELECTOR]
+                vista = padron.take(en_pagina)[['nombre', 'email', 'especialidad']].astype(object)
+                vista.insert(0, 'seleccionado', np.isin(en_pagina, seleccion))
                 
-                seleccionar_todos = st.checkbox("✓ Seleccionar todos", key="sel_todos")
+                st.data_editor(
+                    vista,
+                    key="editor_interesados",
+                    on_change=aplicar_edicion_seleccion,
+                    args=("editor_interesados", en_pagina.tolist()),
+                    disabled=['nombre', 'email', 'especialidad'],
+                    column_config={
+                        "seleccionado": st.column_config.CheckboxColumn("✓", width="small"),
+                        "nombre": "Nombre",
+                        "email": "Email",
+                        "especialidad": "Especialidad",
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
                 
-                seleccionados = []
-                for i, inv in enumerate(interesados_filtrados):
-                    if st.checkbox(
-                        f"**{inv['nombre']}**\n📧 {inv['email']}\n🏷️ {inv['especialidad']}",
-                        value=seleccionar_todos,
-                        key=f"inv_{i}"
-                    ):
-                        seleccionados.append({'nombre': inv['nombre'], 'email': inv['email']})
+                destino = seleccion[~entregado[seleccion]]
                 
-                st.info(f"📌 **{len(seleccionados)}** destinatarios seleccionados")
-                st.session_state.destinatarios_seleccionados = seleccionados
+                st.info(f"📌 **{len(destino)}** destinatarios seleccionados")
+                st.session_state.destinatarios_seleccionados = destino
             
             # Sección de envío (debajo de las dos columnas)
-            if 'convocatoria_seleccionada' in st.session_state and st.session_state.destinatarios_seleccionados:
+            if 'convocatoria_seleccionada' in st.session_state and len(st.session_state.get('destinatarios_seleccionados', ())):
                 st.markdown("---")
                 st.subheader("📧 Enviar Convocatoria")
                 
@@ -727,43 +3935,42 @@ def main():
                     st.info(f"👥 **Destinatarios:** {len(st.session_state.destinatarios_seleccionados)}")
                 with col3:
                     st.info(f"🏛️ **Institución:** {conv['institucion']}")
+                rebotan = int(marcar_emails(
+                    st.session_state.interesados.datos.take(st.session_state.destinatarios_seleccionados),
+                    obtener_lista_rebotes().emails()
+                ).sum())
+                if rebotan:
+                    st.warning(f"🚫 {rebotan} destinatarios están en la lista de rebotes y se omitirán")
                 
                 # Formulario de envío
                 with st.form("form_envio_simplificado"):
                     asunto = st.text_input(
                         "Asunto del correo*",
-                        value=f"🇲🇽 Convocatoria Nacional: {conv['titulo'][:60]}..."
+                        value=asunto_convocatoria(conv)
                     )
                     
-                    mensaje_default = f"""
-Estimado(a) investigador(a):
-
-La **{conv['entidad']}** ha publicado la siguiente convocatoria nacional:
-
-🎯 **{conv['titulo']}**
-🏛️ **Institución:** {conv['institucion']}
-📌 **Tipo:** {conv['tipo']}
-🔗 **Enlace oficial:** {conv['enlace']}
-📅 **Publicación:** {conv['fecha']}
-⏰ **Cierre:** {conv['plazo']}
-
-📋 **Requisitos generales:**
-• Revisar bases en el enlace oficial
-• Preparar documentación requerida
-• Verificar fechas límite
-
-Atentamente,
-**Sistema de Convocatorias Nacionales**
-INCICh - Instituto Nacional de Cardiología
-"""
+                    mensaje_default = mensaje_convocatoria(conv)
                     
                     mensaje = st.text_area("Mensaje*", value=mensaje_default, height=250)
+                    adjunto = st.file_uploader("Adjunto (opcional)")
+                    
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        workers = st.number_input("Conexiones SMTP simultáneas", 1, 10, 4)
+                    with col2:
+                        tasa = st.number_input("Correos por segundo", 0.5, 50.0, 5.0, 0.5)
+                    with col3:
+                        rafaga = st.number_input("Ráfaga máxima", 1, 50, 5)
                     
                     col1, col2 = st.columns(2)
                     with col1:
-                        pausa = st.number_input("Pausa entre correos (s)", 1.0, 5.0, 2.0, 0.5)
+                        modo = st.radio(
+                            "Modo de entrega",
+                            ["Personalizado (un correo por destinatario)", "Anuncio en bloque (CCO, sin saludo)"]
+                        )
                     with col2:
-                        grupo = st.number_input("Correos por grupo", 1, 10, 5)
+                        por_sobre = st.number_input("Destinatarios por sobre", 2, 1000, 100,
+                                                    help="Sólo en modo CCO; la tasa cuenta sobres, no destinatarios")
                     
                     enviar_btn = st.form_submit_button("📨 ENVIAR CORREOS", type="primary", use_container_width=True)
                     
@@ -771,40 +3978,30 @@ INCICh - Instituto Nacional de Cardiología
                         if not asunto or not mensaje:
                             st.error("Completa todos los campos")
                         else:
-                            progress = st.progress(0)
-                            status = st.empty()
-                            
-                            exitosos = 0
-                            total = len(st.session_state.destinatarios_seleccionados)
-                            
-                            for i, inv in enumerate(st.session_state.destinatarios_seleccionados):
-                                status.text(f"📨 {i+1}/{total}: {inv['email']}")
-                                
-                                mensaje_personalizado = f"Estimado(a) {inv['nombre']}:\n\n{mensaje}"
-                                
-                                if enviar_correo(inv['email'], asunto, mensaje_personalizado):
-                                    exitosos += 1
-                                
-                                progress.progress((i + 1) / total)
-                                time.sleep(pausa)
-                                
-                                if (i + 1) % grupo == 0 and (i + 1) < total:
-                                    status.text(f"⏸️ Pausa {pausa_grupo}s...")
-                                    time.sleep(pausa_grupo)
-                            
-                            progress.empty()
-                            status.empty()
-                            
-                            if exitosos > 0:
-                                st.success(f"✅ {exitosos}/{total} correos enviados")
-                                registrar_envio_log(conv['id'], conv['titulo'], total, exitosos)
-                                st.balloons()
-                            else:
-                                st.error("❌ No se enviaron correos")
+                            campana_id = obtener_cola_envios().encolar(
+                                conv,
+                                asunto,
+                                mensaje,
+                                st.session_state.interesados.datos.take(st.session_state.destinatarios_seleccionados),
+                                workers=workers,
+                                tasa=tasa,
+                                rafaga=rafaga,
+                                adjunto_nombre=adjunto.name if adjunto else None,
+                                adjunto=adjunto.getvalue() if adjunto else None,
+                                por_sobre=por_sobre if modo.startswith("Anuncio") else None
+                            )
+                            obtener_trabajador_envios().despertar()
+                            st.success(f"✅ Campaña #{campana_id} encolada: se enviará en segundo plano")
+        
+        mostrar_cola_envios()
     
     with tab2:
         st.header("Estadísticas y Historial")
         mostrar_historial()
+        mostrar_rebotes()
+        mostrar_metricas()
 
 if __name__ == "__main__":
+    if MODO_HEADLESS:
+        sys.exit(cli())
     main()